@@ -0,0 +1,125 @@
+"""Per-command event loop and HTTP overhead, before and after ``runner``.
+
+Each "command" is one trivial coroutine, or one GET against a local aiohttp
+server. "fresh" pays what every command used to: a new event loop and a new
+HTTP session, so a new connection. "runner" runs on the shared
+``agent_chat.runner`` loop and keeps its session (and connection) between
+commands. Both loop implementations are measured when uvloop is installed.
+
+    python benchmarks/bench_loop.py [--runs 200]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+from agent_chat import runner
+
+
+async def _noop() -> None:
+    await asyncio.sleep(0)
+
+
+def _serve() -> str:
+    """Start an HTTP server on its own thread and loop; return its URL."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    url: List[str] = []
+
+    async def start() -> None:
+        app = web.Application()
+        app.router.add_get("/", lambda request: web.json_response({}))
+        app_runner = web.AppRunner(app, access_log=None)
+        await app_runner.setup()
+        site = web.TCPSite(app_runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url.append(f"http://127.0.0.1:{port}/")
+        started.set()
+
+    def main() -> None:
+        asyncio.set_event_loop(loop)
+        loop.create_task(start())
+        loop.run_forever()
+
+    threading.Thread(target=main, daemon=True).start()
+    started.wait()
+    return url[0]
+
+
+def _median_us(call: Callable[[], None], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def _measure(url: str, runs: int) -> Dict[str, float]:
+    factory = runner.loop_factory()
+
+    def fresh_loop() -> None:
+        with asyncio.Runner(loop_factory=factory) as r:
+            r.run(_noop())
+
+    async def fresh_get() -> None:
+        async with ClientSession() as session:
+            async with session.get(url) as response:
+                await response.read()
+
+    def fresh_http() -> None:
+        with asyncio.Runner(loop_factory=factory) as r:
+            r.run(fresh_get())
+
+    session: List[ClientSession] = []
+
+    async def shared_get() -> None:
+        if not session:
+            session.append(ClientSession())
+        async with session[0].get(url) as response:
+            await response.read()
+
+    results = {
+        "loop fresh": _median_us(fresh_loop, runs),
+        "loop runner": _median_us(lambda: runner.run(_noop()), runs),
+        "http fresh": _median_us(fresh_http, runs),
+        "http runner": _median_us(lambda: runner.run(shared_get()), runs),
+    }
+    runner.run(session[0].close())
+    runner.shutdown()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    url = _serve()
+    loops = ["asyncio"]
+    try:
+        import uvloop  # noqa: F401
+
+        loops.append("uvloop")
+    except ImportError:
+        print("uvloop not installed; measuring asyncio only\n")
+
+    print(f"{'loop':<10} {'case':<14} {'median us':>10}")
+    for name in loops:
+        os.environ["AGENT_CHAT_LOOP"] = name
+        for case, micros in _measure(url, args.runs).items():
+            print(f"{name:<10} {case:<14} {micros:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
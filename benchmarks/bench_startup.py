@@ -0,0 +1,119 @@
+"""Startup-time regression benchmark for the ``ac`` entry point.
+
+Runs each subcommand in a fresh interpreter against a throwaway
+AGENT_CHAT_HOME and reports its median wall-clock time as a multiple of a
+bare ``python -c pass``, alongside the ``python -X importtime`` total.
+Budgets are such ratios rather than milliseconds, so a slow machine slows
+both sides alike. Exits non-zero when a command exceeds its budget or
+imports a module it should not need.
+
+    python benchmarks/bench_startup.py [--runs 7] [--scale 1.0]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# (argv, budget as a multiple of interpreter startup, modules that must not be imported)
+CASES: List[Tuple[List[str], float, Tuple[str, ...]]] = [
+    (["notify", "--oneline"], 2.5, ("typer", "rich", "nio", "asyncio")),
+    (["notify", "--json"], 2.5, ("typer", "rich", "nio", "asyncio")),
+    (["channels"], 6.0, ("nio", "keyring", "asyncio")),
+    (["presence-list"], 6.0, ("nio", "keyring", "asyncio")),
+    (["config"], 6.0, ("nio", "keyring", "asyncio")),
+    # Help text is laid out by rich, through typer
+    (["--help"], 10.0, ("nio", "keyring", "asyncio")),
+]
+
+
+def _seed_home(home: Path) -> None:
+    """Give the status-bar commands a live unread index to read from."""
+    (home / "unread.json").write_text(json.dumps({
+        "synced_at": time.time() + 3600,
+        "rooms": {"#alerts": {"count": 2, "urgent": True}},
+    }))
+
+
+def _time(cmd: List[str], env: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} failed: {proc.stderr[-500:]}")
+    return elapsed
+
+
+def _importtime(argv: List[str], env: Dict[str, str]) -> str:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "agent_chat", *argv],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    return proc.stderr
+
+
+def _imports(importtime_log: str) -> Tuple[set, float]:
+    """Top-level module names and total import time (ms) from -X importtime."""
+    modules = set()
+    total_us = 0
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            total_us += int(cumulative)
+        modules.add(name.strip().split(".")[0])
+    return modules, total_us / 1000
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget")
+    args = parser.parse_args(argv)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        home = Path(tmp)
+        _seed_home(home)
+        env = {**os.environ, "AGENT_CHAT_HOME": str(home)}
+
+        # Warm the bytecode cache so the first run isn't an outlier
+        _time([sys.executable, "-m", "agent_chat", "--help"], env)
+        baseline = statistics.median(
+            _time([sys.executable, "-c", "pass"], env) for _ in range(args.runs)
+        )
+        print(f"interpreter startup: {baseline:.1f}ms\n")
+
+        print(f"{'command':<24} {'ms':>8} {'x startup':>10} {'import ms':>10} {'budget':>8}")
+        for case_argv, budget, forbidden in CASES:
+            cmd = [sys.executable, "-m", "agent_chat", *case_argv]
+            median = statistics.median(_time(cmd, env) for _ in range(args.runs))
+            ratio = median / baseline
+            modules, import_ms = _imports(_importtime(case_argv, env))
+            limit = budget * args.scale
+            label = " ".join(case_argv)
+            print(f"{label:<24} {median:>8.1f} {ratio:>10.2f} {import_ms:>10.1f} {limit:>8.1f}")
+
+            if ratio > limit:
+                failures.append(f"{label}: {ratio:.2f}x startup > {limit:.1f}x budget")
+            leaked = sorted(set(forbidden) & modules)
+            if leaked:
+                failures.append(f"{label}: imported {', '.join(leaked)}")
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
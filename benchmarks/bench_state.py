@@ -0,0 +1,79 @@
+"""State-lock contention benchmark for concurrent agents on one host.
+
+Starts N processes that each mark M rooms read through ``AgentChatState``,
+as ``ac listen`` does, against a throwaway AGENT_CHAT_HOME. Runs once with
+every process sharing ``state.json`` and once with each in its own session
+shard (``AGENT_CHAT_SESSION``), and reports wall time and the time spent
+waiting for state locks.
+
+    python benchmarks/bench_state.py [--procs 16] [--writes 50]
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+
+def _worker(args: Tuple[int, int, bool]) -> List[float]:
+    """Do ``writes`` read-marker updates; return each lock wait in ms."""
+    index, writes, sharded = args
+    if sharded:
+        os.environ["AGENT_CHAT_SESSION"] = f"bench-{index}"
+    from agent_chat import state as state_mod
+
+    waits: List[float] = []
+    real_lock = state_mod.file_lock
+
+    @contextmanager
+    def timed_lock(path, timeout: float = -1) -> Iterator[None]:
+        lock = real_lock(path, timeout)
+        start = time.perf_counter()
+        with lock:
+            waits.append((time.perf_counter() - start) * 1000)
+            yield
+
+    state_mod.file_lock = timed_lock
+    for i in range(writes):
+        state = state_mod.AgentChatState.load()
+        state.touch_channel(f"#room{i % 10}", f"$p{index}-{i}")
+    return waits
+
+
+def _run(procs: int, writes: int, sharded: bool) -> Tuple[float, List[float]]:
+    with multiprocessing.Pool(procs) as pool:
+        start = time.perf_counter()
+        results = pool.map(_worker, [(i, writes, sharded) for i in range(procs)])
+        elapsed = time.perf_counter() - start
+    return elapsed, [wait for waits in results for wait in waits]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procs", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    print(f"{args.procs} processes x {args.writes} writes\n")
+    print(f"{'layout':<8} {'wall s':>8} {'wait total s':>13} {'wait p50 ms':>12} {'wait p99 ms':>12}")
+    for sharded in (False, True):
+        with tempfile.TemporaryDirectory() as home:
+            os.environ["AGENT_CHAT_HOME"] = home
+            elapsed, waits = _run(args.procs, args.writes, sharded)
+        p99 = statistics.quantiles(waits, n=100)[98] if len(waits) > 1 else waits[0]
+        print(
+            f"{'shards' if sharded else 'shared':<8} {elapsed:>8.2f} {sum(waits) / 1000:>13.2f}"
+            f" {statistics.median(waits):>12.2f} {p99:>12.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("spawn")
+    sys.exit(main())
@@ -1,44 +1,20 @@
 #!/bin/bash
 set -euo pipefail
 
-CACHE_FILE="${TMPDIR:-/tmp}/agent-chat-notify"
-CACHE_TTL=30
+# ac rewrites this file whenever the unread index or read state changes; its
+# first line is the epoch second after which the counts may be out of date.
+source "${BASH_SOURCE[0]%/*}/session.sh"
 
-python_age() {
-python3 - "$1" <<'PY'
-import os, sys, time
-path = sys.argv[1]
-try:
-    mtime = os.path.getmtime(path)
-except OSError:
-    print(10**9)
-    raise SystemExit
-print(int(time.time() - mtime))
-PY
-}
-
-if [[ -f "$CACHE_FILE" ]]; then
-    AGE=$(python_age "$CACHE_FILE" 2>/dev/null || echo "$CACHE_TTL")
-    if [[ "$AGE" -lt "$CACHE_TTL" ]]; then
-        cat "$CACHE_FILE"
+if [[ -f "$NOTIFY_FILE" ]]; then
+    EXPIRES=0
+    LINE=""
+    { read -r EXPIRES; IFS= read -r LINE; } < "$NOTIFY_FILE" || true
+    printf -v NOW '%(%s)T' -1 2>/dev/null || NOW=$(date +%s)
+    if [[ "$EXPIRES" =~ ^[0-9]+$ && "$NOW" -lt "$EXPIRES" ]]; then
+        printf '%s\n' "$LINE"
         exit 0
     fi
 fi
 
-NOTIFY=$(ac notify --json 2>/dev/null || echo "{}")
-NOTIFY="$NOTIFY" python3 <<'PY' | tee "$CACHE_FILE"
-import os, json
-try:
-    data=json.loads(os.environ.get("NOTIFY", "{}"))
-except Exception:
-    print("")
-    raise SystemExit
-parts=[]
-for key, val in data.items():
-    count=val.get("count",0)
-    if count<=0:
-        continue
-    suffix="!" if val.get("urgent") else ""
-    parts.append(f"{key}({count}{suffix})")
-print(f"[chat] {' '.join(parts)}" if parts else "")
-PY
+# Stale or missing: rescan, which rewrites the file as a side effect
+ac notify --oneline 2>/dev/null || true
@@ -0,0 +1,23 @@
+# Sourced by the status scripts: sets NOTIFY_FILE to this session's notify.txt.
+# Session names are sanitized exactly as agent_chat.config.session_id does.
+
+_agent_chat_session() {
+    # Byte by byte, like session_id on the UTF-8 encoded name
+    local LC_ALL=C
+    local name="${AGENT_CHAT_SESSION:-}"
+    name="${name#"${name%%[![:space:]]*}"}"
+    name="${name%"${name##*[![:space:]]}"}"
+    name="${name//[^A-Za-z0-9_.-]/-}"
+    if [[ "$name" =~ ^\.+$ ]]; then
+        name="${name//./-}"
+    fi
+    SESSION="$name"
+}
+
+_agent_chat_session
+HOME_DIR="${AGENT_CHAT_HOME:-$HOME/.agent-chat}"
+if [[ -n "$SESSION" ]]; then
+    NOTIFY_FILE="$HOME_DIR/sessions/$SESSION/notify.txt"
+else
+    NOTIFY_FILE="$HOME_DIR/notify.txt"
+fi
@@ -8,10 +8,15 @@ from utils import (
     send_status,
     join_project_channel,
     send_to_project,
+    run_in_process,
 )
 
 
 def main() -> None:
+    # Prefer the single-process runner when agent_chat is importable
+    if run_in_process("session-start"):
+        return
+
     nick = get_nick()
     project = get_project()
 
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """Auto-fetch and inject urgent messages on user prompt."""
-from utils import get_alert_count, fetch_alerts
+from utils import get_alert_count, fetch_alerts, run_in_process
 
 
 def main() -> None:
+    if run_in_process("user-prompt-submit"):
+        return
+
     alerts_count = get_alert_count()
     if alerts_count > 0:
         print(f"\n!! URGENT ({alerts_count} unread in #alerts):")
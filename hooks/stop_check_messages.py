@@ -2,10 +2,13 @@
 """Block stop if urgent messages unread."""
 import json
 
-from utils import get_nick, get_alert_count, send_status
+from utils import get_nick, get_alert_count, send_status, run_in_process
 
 
 def main() -> None:
+    if run_in_process("stop"):
+        return
+
     alerts_count = get_alert_count()
 
     if alerts_count > 0:
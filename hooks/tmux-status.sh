@@ -1,5 +1,14 @@
 #!/bin/bash
-NOTIFY=$(ac notify --oneline 2>/dev/null)
-if [[ -n "$NOTIFY" ]]; then
-    echo "[chat: $NOTIFY]"
+# tmux status segment: prints the unread line ac keeps in notify.txt.
+# Reads one file and forks nothing, so it is safe at any status-interval.
+# Once the file's expiry (its first line) has passed, e.g. because no daemon
+# is running, it prints nothing. Run `ac daemon` to keep the counts live.
+source "${BASH_SOURCE[0]%/*}/session.sh"
+
+EXPIRES=0
+LINE=""
+{ read -r EXPIRES; IFS= read -r LINE; } 2>/dev/null < "$NOTIFY_FILE"
+printf -v NOW '%(%s)T' -1 2>/dev/null || NOW=$(date +%s)
+if [[ -n "$LINE" && "$EXPIRES" =~ ^[0-9]+$ && "$NOW" -lt "$EXPIRES" ]]; then
+    printf '%s\n' "$LINE"
 fi
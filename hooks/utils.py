@@ -3,16 +3,45 @@ import json
 import os
 import re
 import subprocess
+import sys
+
+
+def run_in_process(event: str) -> bool:
+    """Run a hook with agent_chat.hooks in this interpreter.
+
+    Returns False when agent_chat isn't importable from this python, in which
+    case callers fall back to the `ac` subprocess helpers below. Any other
+    failure is reported on stderr and the hook prints nothing.
+    """
+    try:
+        from agent_chat.hooks import run_hook
+    except ImportError:
+        return False
+
+    try:
+        output = run_hook(event)
+    except Exception as e:
+        print(f"agent-chat: {event} hook failed: {e}", file=sys.stderr)
+        return True
+    if output:
+        print(output)
+    return True
 
 
 def get_nick() -> str:
     """Load the agent's nick from config, falling back to 'agent'."""
     try:
+        from agent_chat.config import load_profile
+    except ImportError:
+        load_profile = None
+    try:
+        if load_profile is not None:
+            return load_profile().config.identity.username or "agent"
         import tomllib
-        config_path = os.path.expanduser("~/.agent-chat/config.toml")
-        with open(config_path, "rb") as f:
+        home = os.environ.get("AGENT_CHAT_HOME", os.path.expanduser("~/.agent-chat"))
+        with open(os.path.join(home, "config.toml"), "rb") as f:
             config = tomllib.load(f)
-        return config.get("identity", {}).get("username", "agent")
+        return config.get("identity", {}).get("username") or "agent"
     except Exception:
         return "agent"
 
@@ -59,7 +88,7 @@ def send_to_project(message: str, project: str = None) -> bool:
         project = get_project()
 
     result = subprocess.run(
-        ["ac", "send", f"#{project}", message],
+        ["ac", "send", f"#{project}", message, "--queue"],
         capture_output=True,
         text=True
     )
@@ -91,8 +120,8 @@ def fetch_alerts(limit: int = 10) -> str:
 
 
 def send_status(message: str) -> None:
-    """Send a message to the #status channel."""
+    """Queue a message for the #status channel."""
     subprocess.run(
-        ["ac", "send", "#status", message],
+        ["ac", "send", "#status", message, "--queue"],
         capture_output=True
     )
@@ -1,5 +1,11 @@
 """Agent Chat CLI package."""
 
-from .cli import app  # noqa: F401
-
 __all__ = ["app"]
+
+
+def __getattr__(name: str):
+    # Importing the CLI pulls in typer and rich; only do it when asked for.
+    if name == "app":
+        from .cli import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,48 @@
+"""Entry point for ``ac`` and ``python -m agent_chat``.
+
+Status-bar commands such as ``ac notify --oneline`` run many times a minute,
+so they are answered here from local files when possible, before typer, rich
+or nio are imported. Everything else is handed to the full CLI.
+"""
+from __future__ import annotations
+
+import sys
+from typing import Callable, Dict, List, Optional
+
+
+def _fast_notify(args: List[str]) -> bool:
+    """Print unread counts from a live unread index, if there is one."""
+    if not set(args) <= {"--json", "--oneline"}:
+        return False
+
+    from .state import AgentChatState
+    from .unread import UnreadIndex, format_notify, notify_targets
+
+    state = AgentChatState.load()
+    index = UnreadIndex.load(state.session)
+    if not index.is_live():
+        return False
+    results = index.summary(notify_targets(state))
+    output = format_notify(results, json_output="--json" in args, oneline="--oneline" in args)
+    if output:
+        print(output)
+    return True
+
+
+FAST_COMMANDS: Dict[str, Callable[[List[str]], bool]] = {
+    "notify": _fast_notify,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = sys.argv[1:] if argv is None else argv
+    fast = FAST_COMMANDS.get(args[0]) if args else None
+    if fast is not None and fast(args[1:]):
+        return
+
+    from .cli import app
+    app(args=args, prog_name="ac")
+
+
+if __name__ == "__main__":
+    main()
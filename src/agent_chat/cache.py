@@ -0,0 +1,195 @@
+"""On-disk caches of homeserver lookups for agent-chat.
+
+Each cache is a small JSON document under ``CACHE_DIR``. Files are replaced
+atomically, so readers never take a lock; writers re-read before saving so
+concurrent ``ac`` processes merge rather than clobber each other's entries.
+A lost update only costs a cache miss.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .config import APP_DIR
+from .locks import file_lock
+
+CACHE_DIR = APP_DIR / "cache"
+ALIAS_TTL = 24 * 60 * 60
+
+
+class JsonCache:
+    """A JSON object stored in ``CACHE_DIR / name``."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    @property
+    def path(self):
+        return CACHE_DIR / self.name
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self, data: Dict[str, Any]) -> None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+
+    @contextmanager
+    def edit(self) -> Iterator[Dict[str, Any]]:
+        """Load, modify and save the whole document under its lock."""
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path.with_suffix(".lock")):
+            data = self.load()
+            yield data
+            self.save(data)
+
+    def update(self, section: str, changes: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        """Merge ``changes`` into one section and drop ``remove`` keys, under the lock."""
+        with self.edit() as data:
+            entries = data.setdefault(section, {})
+            entries.update(changes)
+            for key in remove:
+                entries.pop(key, None)
+
+
+class AliasCache:
+    """Room alias -> room ID mappings for one homeserver, with a TTL."""
+
+    def __init__(self, homeserver: str, ttl: float = ALIAS_TTL) -> None:
+        self._store = JsonCache("aliases.json")
+        self._homeserver = homeserver
+        self._ttl = ttl
+        self._entries: Dict[str, Dict[str, Any]] = self._store.load().get(homeserver, {})
+
+    def get(self, alias: str) -> Optional[str]:
+        entry = self._entries.get(alias)
+        if not entry or time.time() - entry.get("resolved_at", 0) > self._ttl:
+            return None
+        return entry.get("room_id")
+
+    def put_many(self, mapping: Dict[str, str]) -> None:
+        now = time.time()
+        changes = {alias: {"room_id": room_id, "resolved_at": now} for alias, room_id in mapping.items()}
+        self._entries.update(changes)
+        self._store.update(self._homeserver, changes)
+
+    def put(self, alias: str, room_id: str) -> None:
+        self.put_many({alias: room_id})
+
+    def find(self, alias: str) -> Optional[str]:
+        """Room ID for ``#name`` or ``#name:server``, ignoring the TTL (for offline use)."""
+        for full, entry in self._entries.items():
+            if full == alias or full.split(":", 1)[0] == alias:
+                return entry.get("room_id")
+        return None
+
+    def alias_for(self, room_id: str) -> Optional[str]:
+        """A cached ``#name`` (without server) pointing at ``room_id``."""
+        for full, entry in self._entries.items():
+            if entry.get("room_id") == room_id:
+                return full.split(":", 1)[0]
+        return None
+
+    def invalidate_room(self, room_id: str) -> List[str]:
+        """Forget every alias pointing at ``room_id`` and return them."""
+        stale = [alias for alias, entry in self._entries.items() if entry.get("room_id") == room_id]
+        for alias in stale:
+            del self._entries[alias]
+        if stale:
+            self._store.update(self._homeserver, {}, remove=stale)
+        return stale
+
+
+class DirectCache:
+    """Local copy of one account's ``m.direct`` map: user ID -> DM room ID."""
+
+    def __init__(self, account: str) -> None:
+        self._store = JsonCache("directs.json")
+        self._account = account
+        self._rooms: Dict[str, str] = self._store.load().get(account, {})
+
+    def get(self, user_id: str) -> Optional[str]:
+        return self._rooms.get(user_id)
+
+    def replace(self, direct_map: Dict[str, List[str]]) -> None:
+        """Mirror a full ``m.direct`` map, keeping the newest room per user."""
+        rooms = {user: room_ids[-1] for user, room_ids in direct_map.items() if room_ids}
+        removed = [user for user in self._rooms if user not in rooms]
+        self._rooms = rooms
+        self._store.update(self._account, rooms, remove=removed)
+
+    def put(self, user_id: str, room_id: str) -> None:
+        self._rooms[user_id] = room_id
+        self._store.update(self._account, {user_id: room_id})
+
+
+class SyncCache:
+    """One account's sync token and room memberships (room ID -> join/invite).
+
+    Lets a new client resume with an incremental sync instead of asking the
+    server for a full initial sync.
+    """
+
+    def __init__(self, account: str) -> None:
+        self._store = JsonCache("sync.json")
+        self._account = account
+        entry = self._store.load().get(account, {})
+        self.next_batch: Optional[str] = entry.get("next_batch")
+        self.rooms: Dict[str, str] = entry.get("rooms", {})
+        self._filters: Dict[str, str] = entry.get("filters", {})
+
+    def filter_id(self, key: str) -> Optional[str]:
+        """The uploaded sync filter ID for a filter definition, keyed by digest."""
+        return self._filters.get(key)
+
+    def set_filter_id(self, key: str, filter_id: Optional[str]) -> None:
+        """Remember (or, with ``None``, forget) an uploaded filter's ID."""
+        with self._store.edit() as data:
+            filters = data.setdefault(self._account, {}).setdefault("filters", {})
+            if filter_id:
+                filters[key] = filter_id
+            else:
+                filters.pop(key, None)
+        self._filters = filters
+
+    def joined(self) -> List[str]:
+        return [room_id for room_id, membership in self.rooms.items() if membership == "join"]
+
+    def set_membership(self, room_id: str, membership: Optional[str]) -> None:
+        """Record one room's membership outside a sync (``None`` means left)."""
+        self.record(self.next_batch, {room_id: membership}, keep_token=True)
+
+    def record(
+        self,
+        next_batch: Optional[str],
+        memberships: Dict[str, Optional[str]],
+        full: bool = False,
+        keep_token: bool = False,
+    ) -> None:
+        """Store a sync's token and membership changes (``None`` means left).
+
+        A ``full`` sync lists every room, so it replaces the snapshot. With
+        ``keep_token`` the stored token is left alone.
+        """
+        with self._store.edit() as data:
+            entry = data.setdefault(self._account, {})
+            rooms = {} if full else entry.get("rooms", {})
+            for room_id, membership in memberships.items():
+                if membership:
+                    rooms[room_id] = membership
+                else:
+                    rooms.pop(room_id, None)
+            entry["rooms"] = rooms
+            if not keep_token:
+                entry["next_batch"] = next_batch
+            self.next_batch = entry.get("next_batch")
+        self.rooms = rooms
@@ -1,31 +1,65 @@
 """Agent Chat CLI - Matrix-based coordination for coding agents."""
 from __future__ import annotations
 
+import dataclasses
 import json
 import shutil
 import subprocess
+import sys
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 import typer
-from rich.console import Console
-from rich.table import Table
 
-from .client import MatrixClient, get_client, run_sync
+from .cache import AliasCache
 from .config import AgentChatConfig, APP_DIR
 from .logging import setup_logging, get_logger
+from .models import HistoryMessage, RoomMember, SendResult
 from .presence import update_presence, get_presence, clear_stale
-from .state import AgentChatState
-from .utils import generate_nick, is_channel
+from .state import AgentChatState, session_subscriptions
+from .unread import UnreadIndex, collect_unread, format_notify, notify_targets, wait_for_change
+from .utils import generate_nick, is_channel, parse_time
+
+if TYPE_CHECKING:
+    from .client import MatrixClient
+
+
+
+class _Console:
+    """rich's Console, imported and created on first use.
+
+    rich costs tens of milliseconds to import; commands that print plain
+    text, or nothing, shouldn't pay for it.
+    """
+
+    _console = None
+
+    def __getattr__(self, name: str):
+        if _Console._console is None:
+            from rich.console import Console
+
+            _Console._console = Console()
+        return getattr(_Console._console, name)
+
 
 app = typer.Typer(help="Agent Chat CLI - Matrix coordination for coding agents")
-console = Console()
+console = _Console()
 log = get_logger(__name__)
 
+# Most messages listen --cached shows for a --since range without --last
+CACHED_RANGE_LIMIT = 1000
+
 
 def _get_client() -> MatrixClient:
-    """Get configured Matrix client."""
+    """Get configured Matrix client.
+
+    The client module (and nio with it) is imported here rather than at module
+    load so commands that stay local start quickly.
+    """
+    from .client import get_client
+
     config = AgentChatConfig.load()
     return get_client(config)
 
@@ -39,6 +73,8 @@ def main(verbose: bool = typer.Option(False, "--verbose", "-v", help="Verbose lo
 @app.command()
 def status():
     """Check connectivity and authentication."""
+    from . import runner
+
     client = _get_client()
 
     async def check():
@@ -48,7 +84,7 @@ def status():
         finally:
             await client.close()
 
-    result = run_sync(check())
+    result = runner.run(check())
 
     if result.get("connected"):
         console.print(":white_check_mark: Connected")
@@ -61,53 +97,173 @@ def status():
 
 
 @app.command()
-def send(target: str, message: str):
+def send(
+    targets: Optional[List[str]] = typer.Argument(
+        None, help="Rooms (#general) or users (@BlueLake), then the message"
+    ),
+    message: Optional[str] = typer.Argument(None, help="Message (omit with --stdin)"),
+    stdin: bool = typer.Option(False, "--stdin", help="Send each line of stdin as a message"),
+    queue: bool = typer.Option(False, "--queue", help="Queue for background delivery and return at once"),
+):
     """Send message to room or user.
 
     Examples:
         ac send "#general" "Hello everyone!"
         ac send "@BlueLake" "Can you review my PR?"
+        ac send "#app1" "#app2" "[BUILD] main is green"
+        tail -n 5 build.log | ac send "#alerts" --stdin
+        ac send "#status" "[ONLINE] @greencastle" --queue
     """
-    client = _get_client()
-    state = AgentChatState.load()
+    from . import daemon, runner
+
+    targets = list(targets or [])
+    if stdin:
+        # Every positional argument is a target
+        if message is not None:
+            targets.append(message)
+        lines = [line for line in sys.stdin.read().splitlines() if line.strip()]
+    else:
+        lines = [message] if message is not None else []
+    if not targets or not lines:
+        console.print("Give one or more targets and a message, or use --stdin")
+        raise typer.Exit(1)
+    messages = [[t, line] for line in lines for t in targets]
 
-    async def do_send():
-        try:
-            success = await client.send_message(target, message)
-            if success:
-                if is_channel(target):
-                    state.ensure_subscription(target)
-                    state.touch_channel(target)
-                else:
-                    dm_key = target if target.startswith("@") else f"@{target}"
-                    state.ensure_direct(dm_key)
-                    state.touch_direct(dm_key)
-            return success
-        finally:
-            await client.close()
+    if queue:
+        from . import spool
+
+        for t, line in messages:
+            spool.enqueue(t, line)
+        spool.kick()
+        console.print(f"Queued {len(messages)} message(s)")
+        return
 
-    success = run_sync(do_send())
+    try:
+        raw = daemon.request("send_many", messages=messages)
+        results = [SendResult(**item) for item in raw]
+    except daemon.DaemonError as e:
+        # Not retried directly: the daemon may have sent some of them
+        console.print(f":x: Daemon failed to send: {e}")
+        raise typer.Exit(1)
+    except daemon.DaemonUnavailable:
+        client = _get_client()
 
-    if success:
-        console.print(f"Sent to {target}")
-    else:
-        console.print(f"Failed to send to {target}")
+        async def do_send():
+            try:
+                return await client.send_many((t, line) for t, line in messages)
+            finally:
+                await client.close()
+
+        results = runner.run(do_send())
+
+    state = AgentChatState.load()
+    with state.batch():
+        # Sending isn't reading: the read markers stay where they were, so
+        # unread counts stay exact
+        for target in dict.fromkeys(r.target for r in results if r.ok):
+            if is_channel(target):
+                state.ensure_subscription(target)
+                state.touch_channel(target, state.channels[target].msgid)
+            else:
+                dm_key = target if target.startswith("@") else f"@{target}"
+                state.ensure_direct(dm_key)
+                state.touch_direct(dm_key, state.directs[dm_key].msgid)
+
+    for result in results:
+        if result.ok:
+            console.print(f"Sent to {result.target}")
+        else:
+            console.print(f"Failed to send to {result.target}: {result.error}")
+    if not all(result.ok for result in results):
         raise typer.Exit(1)
 
 
+def _fetch_history(
+    targets: List[str],
+    limit: int,
+    since_ms: Optional[int],
+    until_ms: Optional[int],
+) -> Dict[str, List[HistoryMessage]]:
+    """History from the daemon if one is running, else from the homeserver."""
+    from . import daemon, runner
+
+    try:
+        replies = daemon.request(
+            "listen", targets=targets, limit=limit, since=since_ms, until=until_ms
+        )
+        return {t: [HistoryMessage(**raw) for raw in msgs] for t, msgs in replies.items()}
+    except (daemon.DaemonUnavailable, daemon.DaemonError) as e:
+        log.debug("Daemon unusable, going direct: %s", e)
+        client = _get_client()
+
+        async def do_listen():
+            try:
+                return await client.fetch_many(targets, limit, since=since_ms, until=until_ms)
+            finally:
+                await client.close()
+
+        return runner.run(do_listen())
+
+
+def _local_room_id(target: str, aliases: AliasCache) -> Optional[str]:
+    """Resolve a channel or room ID without the network."""
+    if target.startswith("!"):
+        return target
+    if is_channel(target):
+        return aliases.find(target)
+    return None
+
+
+def _cached_history(
+    targets: List[str],
+    last: Optional[int],
+    since_ms: Optional[int],
+    until_ms: Optional[int],
+) -> Dict[str, List[HistoryMessage]]:
+    """History from the local message store."""
+    from .events import EventStore
+
+    aliases = AliasCache(AgentChatConfig.load().server.url)
+    store = EventStore()
+    history = {}
+    try:
+        for t in targets:
+            room_id = _local_room_id(t, aliases)
+            if not room_id:
+                console.print(f"No cached room for {t}")
+                continue
+            limit = last or (20 if since_ms is None else CACHED_RANGE_LIMIT)
+            history[t] = store.history(room_id, limit, since=since_ms, until=until_ms)
+    finally:
+        store.close()
+    return history
+
+
 @app.command()
 def listen(
     target: Optional[str] = typer.Argument(None, help="Room (#general) or user (@BlueLake)"),
-    last: int = typer.Option(20, "--last", help="Number of messages"),
+    last: Optional[int] = typer.Option(None, "--last", help="Number of messages (default 20)"),
     all_rooms: bool = typer.Option(False, "--all", help="Listen to all subscribed rooms"),
+    since: Optional[str] = typer.Option(None, "--since", help="Messages since 2h, 30m or an ISO time"),
+    until: Optional[str] = typer.Option(None, "--until", help="Messages up to 1h, 10m or an ISO time"),
+    cached: bool = typer.Option(False, "--cached", help="Read the local message store only, offline"),
 ):
     """Fetch recent messages from a room or user.
 
     Examples:
         ac listen "#general" --last 10
         ac listen --all
+        ac listen "#myapp" --since 2h --until 30m
+        ac listen "#general" --cached
     """
-    client = _get_client()
+    try:
+        since_ms = parse_time(since) if since else None
+        until_ms = parse_time(until) if until else None
+    except ValueError as e:
+        console.print(f":x: {e}")
+        raise typer.Exit(1)
+    # A time range returns everything in it unless --last is given
+    limit = last or 20
     state = AgentChatState.load()
 
     targets = []
@@ -119,57 +275,198 @@ def listen(
         console.print("Specify a room or use --all")
         raise typer.Exit(1)
 
-    async def do_listen():
+    if cached:
+        history = _cached_history(targets, last, since_ms, until_ms)
+    else:
+        history = _fetch_history(targets, limit, since_ms, until_ms)
+    if last and since_ms is not None:
+        history = {t: messages[-last:] for t, messages in history.items()}
+    # Skip read markers when the window may stop short of the latest message
+    mark_read = until_ms is None and not cached
+
+    from rich.table import Table
+
+    for t, messages in history.items():
+        table = Table(title=t)
+        table.add_column("Time", style="dim")
+        table.add_column("Nick", style="cyan")
+        table.add_column("Message")
+
+        for msg in messages:
+            # Format timestamp
+            time_str = ""
+            if msg.timestamp:
+                dt = datetime.fromtimestamp(msg.timestamp / 1000)
+                time_str = dt.strftime("%H:%M")
+
+            # Extract display name from sender
+            nick = msg.sender.split(":")[0].lstrip("@")
+
+            table.add_row(time_str, nick, msg.text)
+
+        console.print(table)
+
+    read = {t: messages[-1].event_id for t, messages in history.items() if messages}
+    if read and mark_read:
+        with state.batch():
+            for t, event_id in read.items():
+                if is_channel(t):
+                    state.touch_channel(t, event_id)
+                else:
+                    state.touch_direct(t, event_id)
+        with UnreadIndex.edit(state.session) as index:
+            for t, event_id in read.items():
+                index.mark_read(t, event_id)
+
+
+def _tail_line(target: str, msg: HistoryMessage, json_output: bool) -> str:
+    if json_output:
+        return json.dumps({"room": target, **dataclasses.asdict(msg)})
+    time_str = datetime.fromtimestamp(msg.timestamp / 1000).strftime("%H:%M:%S") if msg.timestamp else ""
+    nick = msg.sender.split(":")[0].lstrip("@")
+    return f"{time_str} {target} {nick}: {msg.text}"
+
+
+@app.command()
+def tail(
+    targets: Optional[List[str]] = typer.Argument(None, help="Rooms (#general) or users (@BlueLake)"),
+    all_rooms: bool = typer.Option(False, "--all", help="Every subscribed room"),
+    follow: bool = typer.Option(False, "--follow", "-f", help="Keep printing new messages as they arrive"),
+    last: int = typer.Option(10, "--last", "-n", help="Recent messages to print first"),
+    json_output: bool = typer.Option(False, "--json", help="One JSON object per line"),
+):
+    """Print the latest messages, one per line, and optionally follow new ones.
+
+    Examples:
+        ac tail "#general"
+        ac tail -f "#myapp" "#alerts"
+        ac tail -f --all --json | jq .text
+    """
+    from . import runner
+
+    rooms = list(AgentChatState.load().subscribed_channels) if all_rooms else list(targets or [])
+    if not rooms:
+        console.print("Specify rooms or use --all")
+        raise typer.Exit(1)
+
+    client = _get_client()
+
+    async def do_tail():
         try:
-            for t in targets:
-                messages = await client.fetch_history(t, last)
-
-                table = Table(title=t)
-                table.add_column("Time", style="dim")
-                table.add_column("Nick", style="cyan")
-                table.add_column("Message")
-
-                for msg in messages:
-                    # Format timestamp
-                    time_str = ""
-                    if msg.timestamp:
-                        dt = datetime.fromtimestamp(msg.timestamp / 1000)
-                        time_str = dt.strftime("%H:%M")
-
-                    # Extract display name from sender
-                    nick = msg.sender.split(":")[0].lstrip("@")
-
-                    table.add_row(time_str, nick, msg.text)
-
-                console.print(table)
-
-                # Update state
-                if messages:
-                    if is_channel(t):
-                        state.touch_channel(t, messages[-1].event_id)
-                    else:
-                        state.touch_direct(t, messages[-1].event_id)
+            newest = int(time.time() * 1000)
+            printed = set()
+            if last > 0:
+                history = await client.fetch_many(rooms, last)
+                backlog = sorted(
+                    ((t, msg) for t, messages in history.items() for msg in messages),
+                    key=lambda item: item[1].timestamp or 0,
+                )
+                for t, msg in backlog:
+                    typer.echo(_tail_line(t, msg, json_output))
+                    printed.add(msg.event_id)
+                    newest = max(newest, msg.timestamp or 0)
+            if not follow:
+                return
+            async for t, msg in client.stream(rooms, after=newest):
+                if msg.event_id not in printed:
+                    typer.echo(_tail_line(t, msg, json_output))
+                    sys.stdout.flush()
         finally:
             await client.close()
 
-    run_sync(do_listen())
+    try:
+        runner.run(do_tail())
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def search(
+    query: str = typer.Argument(..., help="Words to find, e.g. 'HANDOFF auth'"),
+    room: Optional[str] = typer.Option(None, "--room", help="Only this channel (#general) or room ID"),
+    sender: Optional[str] = typer.Option(None, "--sender", help="Only messages from this nick or user ID"),
+    since: Optional[str] = typer.Option(None, "--since", help="Messages since 2h, 30m or an ISO time"),
+    limit: int = typer.Option(50, "--limit", help="Most results to show"),
+):
+    """Search messages seen earlier, from the local store (no network).
+
+    Examples:
+        ac search HANDOFF
+        ac search "auth refactor" --room "#myapp" --since 2d
+        ac search DONE --sender bluelake
+    """
+    from .events import EventStore
+
+    if not query.split():
+        console.print("Give some words to search for")
+        raise typer.Exit(1)
+    try:
+        since_ms = parse_time(since) if since else None
+    except ValueError as e:
+        console.print(f":x: {e}")
+        raise typer.Exit(1)
+
+    aliases = AliasCache(AgentChatConfig.load().server.url)
+    room_id = None
+    if room:
+        room_id = _local_room_id(room, aliases)
+        if not room_id:
+            console.print(f"No cached room for {room}")
+            raise typer.Exit(1)
+
+    store = EventStore()
+    try:
+        results = store.search(query, room_id=room_id, sender=sender, since=since_ms, limit=limit)
+    finally:
+        store.close()
+
+    from rich.table import Table
+
+    table = Table(title=f"Search: {query}")
+    table.add_column("Time", style="dim")
+    table.add_column("Room")
+    table.add_column("Nick", style="cyan")
+    table.add_column("Message")
+    for msg in results:
+        time_str = ""
+        if msg.timestamp:
+            time_str = datetime.fromtimestamp(msg.timestamp / 1000).strftime("%m-%d %H:%M")
+        nick = msg.sender.split(":")[0].lstrip("@")
+        table.add_row(time_str, aliases.alias_for(msg.room_id) or msg.room_id, nick, msg.text)
+    console.print(table)
 
 
 @app.command()
 def channels(
     subscribe: Optional[str] = typer.Option(None, "--subscribe", help="Subscribe to a room"),
 ):
-    """List subscribed rooms."""
+    """List subscribed rooms.
+
+    With AGENT_CHAT_SESSION set, subscribing only affects this session. The
+    table merges every session's subscriptions on this machine, marking the
+    ones this process sees with *.
+    """
     state = AgentChatState.load()
 
     if subscribe:
         state.ensure_subscription(subscribe)
         console.print(f"Subscribed to {subscribe}")
 
+    sessions: Dict[str, List[str]] = {}
+    for session, subscribed in session_subscriptions().items():
+        for ch in subscribed:
+            sessions.setdefault(ch, []).append(session or "shared")
+    for ch in state.subscribed_channels:
+        sessions.setdefault(ch, [])
+
+    from rich.table import Table
+
     table = Table(title="Subscribed Rooms")
     table.add_column("Room")
-    for ch in state.subscribed_channels:
-        table.add_row(ch)
+    table.add_column("Sessions", style="dim")
+    for ch, names in sessions.items():
+        mark = "*" if ch in state.subscribed_channels else " "
+        table.add_row(f"{mark} {ch}", ", ".join(names))
     console.print(table)
 
 
@@ -220,6 +517,8 @@ def register(
 
     If username is not provided, a random one will be generated.
     """
+    from . import runner
+
     config = AgentChatConfig.load()
 
     if not username:
@@ -244,7 +543,7 @@ def register(
             await client.close()
 
     try:
-        result = run_sync(do_register())
+        result = runner.run(do_register())
         config.identity.username = username
         config.save()
         console.print(f":white_check_mark: Registered as {result['user_id']}")
@@ -259,6 +558,8 @@ def login(
     password: Optional[str] = typer.Option(None, "--password", "-p", help="Password"),
 ):
     """Login to the Matrix homeserver."""
+    from . import runner
+
     config = AgentChatConfig.load()
 
     if password is None:
@@ -274,7 +575,7 @@ def login(
             await client.close()
 
     try:
-        result = run_sync(do_login())
+        result = runner.run(do_login())
         config.identity.username = username
         config.save()
         console.print(f":white_check_mark: Logged in as {result['user_id']}")
@@ -287,92 +588,74 @@ def login(
 def notify(
     json_output: bool = typer.Option(False, "--json", help="Output as JSON"),
     oneline: bool = typer.Option(False, "--oneline", help="One-line format for tmux"),
+    wait: bool = typer.Option(False, "--wait", help="Block until the counts change, then print them"),
+    timeout: Optional[float] = typer.Option(None, "--timeout", help="Give up waiting after this many seconds"),
 ):
-    """Check for unread messages (for hooks/status bars)."""
-    client = _get_client()
-    state = AgentChatState.load()
-    results: dict[str, dict[str, object]] = {}
+    """Check for unread messages (for hooks/status bars).
 
-    async def do_notify():
+    Answered from the local unread index while a daemon keeps it current;
+    otherwise every subscribed room is rescanned on the homeserver.
+    """
+    from . import daemon, runner
+
+    if wait:
         try:
-            for room in state.subscribed_channels:
-                messages = await client.fetch_history(room, 20)
-                # Filter to messages newer than last seen
-                entry = state.channels.get(room)
-                if entry and entry.msgid:
-                    # Find messages after the last seen one
-                    new_msgs = []
-                    found_last = False
-                    for msg in messages:
-                        if found_last:
-                            new_msgs.append(msg)
-                        elif msg.event_id == entry.msgid:
-                            found_last = True
-                    messages = new_msgs if found_last else messages
-
-                results[room] = {
-                    "count": len(messages),
-                    "urgent": any(m.text.lower().startswith("!urgent") for m in messages),
-                }
-
-            for dm_key in state.directs:
-                messages = await client.fetch_history(dm_key, 20)
-                entry = state.directs.get(dm_key)
-                if entry and entry.msgid:
-                    new_msgs = []
-                    found_last = False
-                    for msg in messages:
-                        if found_last:
-                            new_msgs.append(msg)
-                        elif msg.event_id == entry.msgid:
-                            found_last = True
-                    messages = new_msgs if found_last else messages
-
-                results[dm_key] = {
-                    "count": len(messages),
-                    "urgent": any(m.text.lower().startswith("!urgent") for m in messages),
-                }
-        finally:
-            await client.close()
+            wait_for_change(timeout)
+        except KeyboardInterrupt:
+            return
+
+    results: dict[str, dict[str, object]] = {}
+    state = AgentChatState.load()
+    index = UnreadIndex.load(state.session)
 
     try:
-        run_sync(do_notify())
-    except Exception as e:
+        if index.is_live():
+            results = index.summary(notify_targets(state))
+        else:
+            results = daemon.request("notify", session=state.session)
+    except daemon.DaemonUnavailable:
+        client = _get_client()
+
+        async def do_notify():
+            try:
+                return await collect_unread(client, state)
+            finally:
+                await client.close()
+
+        try:
+            results = runner.run(do_notify())
+        except Exception as e:
+            log.warning("Notify check failed: %s", e)
+            # Degrade gracefully - return empty results
+    except daemon.DaemonError as e:
         log.warning("Notify check failed: %s", e)
-        # Degrade gracefully - return empty results
-        pass
 
-    if json_output:
-        console.print(json.dumps(results))
-    elif oneline:
-        parts = [
-            f"{key}({data['count']}{'!' if data['urgent'] else ''})"
-            for key, data in results.items()
-            if data.get("count", 0) > 0
-        ]
-        if parts:
-            console.print("[chat] " + " ".join(parts))
-    else:
-        for key, data in results.items():
-            count = data.get("count", 0)
-            if count > 0:
-                urgent = " (URGENT)" if data.get("urgent") else ""
-                console.print(f"{key}: {count} new messages{urgent}")
+    output = format_notify(results, json_output=json_output, oneline=oneline)
+    if output:
+        typer.echo(output)
 
 
 @app.command()
 def who(room: str = typer.Argument("#general", help="Room to list members of")):
     """List members of a room."""
-    client = _get_client()
+    from . import daemon, runner
 
-    async def do_who():
-        try:
-            members = await client.get_room_members(room)
-            return members
-        finally:
-            await client.close()
+    try:
+        members = [RoomMember(**raw) for raw in daemon.request("who", room=room)]
+    except (daemon.DaemonUnavailable, daemon.DaemonError) as e:
+        log.debug("Daemon unusable, going direct: %s", e)
+        client = _get_client()
 
-    members = run_sync(do_who())
+        async def do_who():
+            try:
+                members = await client.get_room_members(room)
+                return members
+            finally:
+                await client.close()
+
+        members = runner.run(do_who())
+
+    from rich.table import Table
 
     table = Table(title=f"Users in {room}")
     table.add_column("Nick")
@@ -393,17 +676,24 @@ def join(
         ac join "#my-project"
         ac join "#new-channel" --topic "Discussion about feature X"
     """
-    client = _get_client()
+    from . import daemon, runner
+
     state = AgentChatState.load()
 
-    async def do_join():
-        try:
-            room_id = await client.join_or_create_room(room, topic=topic)
-            return room_id
-        finally:
-            await client.close()
+    try:
+        room_id = daemon.request("join", room=room, topic=topic)
+    except (daemon.DaemonUnavailable, daemon.DaemonError) as e:
+        log.debug("Daemon unusable, going direct: %s", e)
+        client = _get_client()
+
+        async def do_join():
+            try:
+                room_id = await client.join_or_create_room(room, topic=topic)
+                return room_id
+            finally:
+                await client.close()
 
-    room_id = run_sync(do_join())
+        room_id = runner.run(do_join())
 
     if room_id:
         # Add to subscribed channels
@@ -423,6 +713,8 @@ def create_room(
     topic: str = typer.Option("", "--topic", help="Room topic"),
 ):
     """Create a new room."""
+    from . import runner
+
     client = _get_client()
 
     async def do_create():
@@ -432,7 +724,7 @@ def create_room(
         finally:
             await client.close()
 
-    room_id = run_sync(do_create())
+    room_id = runner.run(do_create())
 
     if room_id:
         console.print(f":white_check_mark: Created room {alias}")
@@ -442,6 +734,81 @@ def create_room(
         raise typer.Exit(1)
 
 
+@app.command("daemon")
+def daemon_cmd(
+    stop: bool = typer.Option(False, "--stop", help="Stop a running daemon"),
+    show_status: bool = typer.Option(False, "--status", help="Check whether a daemon is running"),
+):
+    """Run a persistent client that other ac commands talk to over a Unix socket.
+
+    While the daemon runs, send, listen, notify, who and join reuse its
+    connection instead of logging in to the homeserver on every call.
+
+    Examples:
+        ac daemon &
+        ac daemon --status
+        ac daemon --stop
+    """
+    from . import daemon, runner
+
+    if stop or show_status:
+        try:
+            result = daemon.request("stop" if stop else "ping", timeout=5.0)
+        except (daemon.DaemonUnavailable, daemon.DaemonError, OSError):
+            console.print("Daemon not running")
+            raise typer.Exit(1)
+        if stop:
+            console.print("Daemon stopping")
+        else:
+            console.print(f"Daemon running (pid {result['pid']}) on {daemon.SOCKET_PATH}")
+        return
+
+    server = daemon.Daemon(_get_client())
+    console.print(f"Daemon listening on {daemon.SOCKET_PATH}")
+    try:
+        runner.run(server.serve())
+    except RuntimeError as e:
+        console.print(f":x: {e}")
+        raise typer.Exit(1)
+
+
+@app.command()
+def flush():
+    """Deliver messages queued with --queue (or by hooks) until the queue is empty."""
+    from . import runner, spool
+
+    if not spool.pending():
+        return
+    client = _get_client()
+
+    async def do_flush():
+        try:
+            await spool.drain(client)
+        finally:
+            await client.close()
+
+    runner.run(do_flush())
+
+
+@app.command()
+def hook(event: str = typer.Argument(..., help="session-start, user-prompt-submit or stop")):
+    """Run a Claude Code hook workflow in this process.
+
+    Examples:
+        ac hook session-start
+        ac hook stop
+    """
+    from .hooks import run_hook
+
+    try:
+        output = run_hook(event)
+    except ValueError as e:
+        console.print(f":x: {e}")
+        raise typer.Exit(1)
+    if output:
+        typer.echo(output)
+
+
 VALID_STATUSES = {"online", "busy", "away", "offline"}
 STATUS_STYLES = {
     "online": "green",
@@ -464,6 +831,8 @@ def presence(
         ac presence away
         ac presence offline
     """
+    from . import runner
+
     status_lower = status.lower()
     if status_lower not in VALID_STATUSES:
         console.print(f":x: Invalid status. Use one of: {', '.join(sorted(VALID_STATUSES))}")
@@ -476,19 +845,21 @@ def presence(
 
     client = _get_client()
 
-    async def announce():
+    async def publish():
         try:
-            prefix = f"[{status_lower.upper()}]"
-            msg = f"{prefix} @{nick}"
+            if await client.set_presence(status_lower, message):
+                return
+            # An older #status may not take state events; announce instead
+            msg = f"[{status_lower.upper()}] @{nick}"
             if message:
                 msg += f" - {message}"
             await client.send_message("#status", msg)
         except Exception as e:
-            log.warning("Could not announce presence: %s", e)
+            log.warning("Could not publish presence: %s", e)
         finally:
             await client.close()
 
-    run_sync(announce())
+    runner.run(publish())
 
     console.print(f":white_check_mark: Status set to {status_lower}")
     if message:
@@ -497,18 +868,39 @@ def presence(
 
 @app.command("presence-list")
 def presence_list(
-    clear: bool = typer.Option(False, "--clear-stale", help="Remove stale entries"),
+    clear: bool = typer.Option(False, "--clear-stale", help="Drop offline agents now"),
+    refresh: bool = typer.Option(False, "--refresh", help="Re-read every agent's presence from #status"),
 ):
     """List all agent presence statuses.
 
+    Reads the local presence cache, which every sync keeps current. An
+    agent whose presence lease runs out is shown offline automatically.
+
     Examples:
         ac presence-list
+        ac presence-list --refresh
         ac presence-list --clear-stale
     """
+    if refresh:
+        from . import runner
+
+        client = _get_client()
+
+        async def do_refresh():
+            try:
+                return await client.fetch_presence()
+            finally:
+                await client.close()
+
+        try:
+            runner.run(do_refresh())
+        except Exception as e:
+            console.print(f":x: Could not refresh presence: {e}")
+
     if clear:
         removed = clear_stale()
         if removed:
-            console.print(f"Cleared {removed} stale entries")
+            console.print(f"Cleared {removed} offline agents")
 
     agents = get_presence()
 
@@ -516,10 +908,13 @@ def presence_list(
         console.print("No agents currently tracked")
         return
 
+    from rich.table import Table
+
     table = Table(title="Agent Presence")
     table.add_column("Agent", style="cyan")
     table.add_column("Status")
     table.add_column("Message")
+    table.add_column("Host", style="dim")
     table.add_column("Last Seen", style="dim")
 
     for nick, info in agents.items():
@@ -529,7 +924,7 @@ def presence_list(
         last_seen = info.get("last_seen", "")
         if last_seen:
             try:
-                dt = datetime.fromisoformat(last_seen)
+                dt = datetime.fromisoformat(last_seen).astimezone()
                 last_seen = dt.strftime("%H:%M")
             except ValueError:
                 pass
@@ -538,6 +933,7 @@ def presence_list(
             nick,
             f"[{status_style}]{status}[/{status_style}]",
             info.get("message", ""),
+            info.get("host", ""),
             last_seen,
         )
 
@@ -582,6 +978,8 @@ def setup(
     - User registration
     - Claude Code plugin integration
     """
+    from . import runner
+
     console.print("\n[bold cyan]agent-chat setup[/bold cyan]\n")
     console.print("Real-time coordination for AI coding agents.\n")
 
@@ -676,41 +1074,34 @@ def setup(
 
     client = _get_client()
 
-    async def do_register():
+    async def do_account():
         try:
-            result = await client.register(username, password)
-            return result
+            try:
+                return "Registered", await client.register(username, password)
+            except Exception as e:
+                err_str = str(e).lower()
+                if "user_in_use" not in err_str and "already" not in err_str:
+                    raise
+            console.print(f"  Username '{username}' already exists. Trying login...")
+            try:
+                return "Logged in", await client.login(username, password)
+            except Exception as login_err:
+                raise RuntimeError(f"Login failed: {login_err}") from login_err
         finally:
             await client.close()
 
     try:
-        result = run_sync(do_register())
-        config.identity.username = username
-        config.identity.display_name = username.title()
-        config.save()
-        console.print(f"  ✓ Registered as {result['user_id']}\n")
+        action, result = runner.run(do_account())
+    except RuntimeError as e:
+        console.print(f"  [red]{e}[/red]")
+        raise typer.Exit(1)
     except Exception as e:
-        err_str = str(e).lower()
-        if "user_in_use" in err_str or "already" in err_str:
-            console.print(f"  Username '{username}' already exists. Trying login...")
-            try:
-                async def do_login():
-                    try:
-                        return await client.login(username, password)
-                    finally:
-                        await client.close()
-
-                result = run_sync(do_login())
-                config.identity.username = username
-                config.identity.display_name = username.title()
-                config.save()
-                console.print(f"  ✓ Logged in as {result['user_id']}\n")
-            except Exception as login_err:
-                console.print(f"  [red]Login failed: {login_err}[/red]")
-                raise typer.Exit(1)
-        else:
-            console.print(f"  [red]Registration failed: {e}[/red]")
-            raise typer.Exit(1)
+        console.print(f"  [red]Registration failed: {e}[/red]")
+        raise typer.Exit(1)
+    config.identity.username = username
+    config.identity.display_name = username.title()
+    config.save()
+    console.print(f"  ✓ {action} as {result['user_id']}\n")
 
     # Step 4: Claude Code plugin
     if not skip_plugin:
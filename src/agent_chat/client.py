@@ -2,40 +2,98 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass
-from typing import Any, Coroutine, Dict, List, Optional
+import hashlib
+import json
+import uuid
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote, urlencode
 
 from nio import (
     AsyncClient,
     AsyncClientConfig,
+    DirectRoomsResponse,
+    ErrorResponse,
+    JoinResponse,
     LoginResponse,
+    MessageDirection,
+    RoomGetStateResponse,
     RoomMessagesResponse,
+    RoomPutStateResponse,
     RoomSendResponse,
     SyncResponse,
     RoomVisibility,
+    UploadFilterResponse,
 )
 
+from .cache import AliasCache, DirectCache, SyncCache
 from .config import AgentChatConfig, get_credentials, set_credentials
+from .events import EventStore
 from .logging import get_logger
+from .models import HistoryMessage, RoomMember, SendResult
+from .presence import PRESENCE_EVENT, PRESENCE_ROOM, local_fields, presence_content, record_presence
 
 log = get_logger(__name__)
 
-
-@dataclass
-class HistoryMessage:
-    """A message from room history."""
-    room_id: str
-    sender: str
-    text: str
-    event_id: Optional[str]
-    timestamp: Optional[int]
-
-
-@dataclass
-class RoomMember:
-    """A member of a room."""
-    user_id: str
-    display_name: Optional[str]
+# Errors meaning a cached room ID no longer works for us
+STALE_ROOM_ERRORS = {"M_NOT_FOUND", "M_FORBIDDEN"}
+# Defaults for fetch_many: rooms fetched at once, and seconds before a room is skipped
+FETCH_CONCURRENCY = 8
+FETCH_TIMEOUT = 10.0
+# Sends send_many keeps in flight at once
+SEND_CONCURRENCY = 4
+# Most pages fetch_history reads looking for a lower bound
+HISTORY_MAX_PAGES = 50
+# History pages only need message events
+HISTORY_FILTER: Dict[str, Any] = {"types": ["m.room.message"]}
+# Reconnect delays for stream(), in seconds: doubled per failure up to the max
+STREAM_RETRY_DELAY = 1.0
+STREAM_MAX_RETRY_DELAY = 30.0
+
+# Power levels for a new PRESENCE_ROOM: the server defaults for room events,
+# plus any member may publish their own presence
+PRESENCE_POWER_LEVELS: Dict[str, Any] = {
+    "events": {
+        "m.room.name": 50,
+        "m.room.avatar": 50,
+        "m.room.canonical_alias": 50,
+        "m.room.power_levels": 100,
+        "m.room.history_visibility": 100,
+        "m.room.encryption": 100,
+        "m.room.server_acl": 100,
+        "m.room.tombstone": 100,
+        PRESENCE_EVENT: 0,
+    },
+}
+
+# Server-side sync filter: we only read message bodies, our memberships,
+# agent presence state and m.direct, so skip Matrix presence, receipts,
+# typing and other state entirely.
+SYNC_FILTER: Dict[str, Any] = {
+    "presence": {"not_types": ["*"]},
+    "account_data": {"types": ["m.direct"]},
+    "room": {
+        "timeline": {
+            "types": ["m.room.message", "m.room.member", PRESENCE_EVENT],
+            "limit": 20,
+            "lazy_load_members": True,
+        },
+        "state": {"types": ["m.room.member", PRESENCE_EVENT], "lazy_load_members": True},
+        "ephemeral": {"not_types": ["*"]},
+        "account_data": {"not_types": ["*"]},
+    },
+}
+SYNC_FILTER_KEY = hashlib.sha256(json.dumps(SYNC_FILTER, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def account_data_path(user_id: str, event_type: str, access_token: str) -> str:
+    """Client-server API path for writing one of a user's account data events.
+
+    Only needed while matrix-nio has no public ``set_account_data``.
+    """
+    user, kind = quote(user_id, safe=""), quote(event_type, safe="")
+    query = urlencode({"access_token": access_token})
+    return f"/_matrix/client/v3/user/{user}/account_data/{kind}?{query}"
 
 
 class MatrixClient:
@@ -44,6 +102,17 @@ class MatrixClient:
     def __init__(self, config: AgentChatConfig) -> None:
         self._config = config
         self._client: Optional[AsyncClient] = None
+        self._aliases = AliasCache(config.server.url)
+        self._directs: Optional[DirectCache] = None
+        self._syncs: Optional[SyncCache] = None
+        # Local copy of every message we see, for ac search and listen --cached
+        self._events = EventStore()
+        # target -> pagination token at the newest event fetched, see history_token
+        self._history_tokens: Dict[str, str] = {}
+        # Joins skipped because the sync snapshot says we're already in the room
+        self._avoided_joins = 0
+        # Serializes DM creation so concurrent fetches can't race on m.direct
+        self._dm_lock = asyncio.Lock()
 
     async def _get_client(self) -> AsyncClient:
         """Get or create authenticated client."""
@@ -71,6 +140,11 @@ class MatrixClient:
 
         return self._client
 
+    @property
+    def user_id(self) -> Optional[str]:
+        """The logged-in user ID, once the client has been created."""
+        return self._client.user_id if self._client else None
+
     @property
     def _server_name(self) -> str:
         """Extract server name from URL."""
@@ -83,6 +157,7 @@ class MatrixClient:
         if self._client:
             await self._client.close()
             self._client = None
+        self._events.close()
 
     async def register(self, username: str, password: str) -> Dict[str, Any]:
         """Register a new user account."""
@@ -142,31 +217,184 @@ class MatrixClient:
 
     async def check_status(self) -> Dict[str, Any]:
         """Check connection status with a quick sync."""
-        client = await self._get_client()
-
         try:
-            response = await client.sync(timeout=0, full_state=False)
-            if isinstance(response, SyncResponse):
-                return {
-                    "connected": True,
-                    "user_id": client.user_id,
-                    "rooms": len(response.rooms.join),
-                }
-            else:
-                return {"connected": False, "error": str(response)}
+            await self.sync_once(timeout=0)
+            return {
+                "connected": True,
+                "user_id": self.user_id,
+                "rooms": len(self._sync_cache().joined()),
+            }
         except Exception as e:
             return {"connected": False, "error": str(e)}
 
-    async def resolve_room_alias(self, alias: str) -> Optional[str]:
-        """Resolve a room alias (#general) to room ID (!abc:server)."""
+    def _sync_cache(self) -> SyncCache:
+        if self._syncs is None:
+            self._syncs = SyncCache(self.user_id or "")
+        return self._syncs
+
+    async def _sync_filter(self) -> Union[str, Dict[str, Any]]:
+        """ID of our uploaded ``SYNC_FILTER``, uploading it on first use.
+
+        Falls back to sending the filter inline if the upload fails.
+        """
+        syncs = self._sync_cache()
+        filter_id = syncs.filter_id(SYNC_FILTER_KEY)
+        if filter_id:
+            return filter_id
+
+        client = await self._get_client()
+        response = await client.upload_filter(**SYNC_FILTER)
+        if not isinstance(response, UploadFilterResponse):
+            log.warning("Failed to upload sync filter: %s", response)
+            return SYNC_FILTER
+        syncs.set_filter_id(SYNC_FILTER_KEY, response.filter_id)
+        return response.filter_id
+
+    async def sync_once(self, timeout: int = 30000) -> SyncResponse:
+        """Run one incremental sync, long-polling for up to ``timeout`` ms.
+
+        The sync token and our room memberships are kept on disk, so a new
+        client carries on from the last sync of any earlier ``ac`` call and
+        only falls back to a full initial sync when there is no usable token.
+        Every sync uses ``SYNC_FILTER``.
+        """
         client = await self._get_client()
+        syncs = self._sync_cache()
+        since = client.next_batch or syncs.next_batch
+        first = not client.next_batch
+        response = await client.sync(
+            timeout=timeout,
+            sync_filter=await self._sync_filter(),
+            since=since,
+            full_state=False,
+        )
+        if not isinstance(response, SyncResponse) and first:
+            # The stored token or filter ID may be unknown to the server
+            log.info("Sync from stored state failed (%s), doing a full sync", response)
+            syncs.set_filter_id(SYNC_FILTER_KEY, None)
+            since = None
+            response = await client.sync(timeout=timeout, sync_filter=SYNC_FILTER, full_state=False)
+        if not isinstance(response, SyncResponse):
+            raise RuntimeError(f"Sync failed: {response}")
+
+        memberships: Dict[str, Optional[str]] = {room_id: None for room_id in response.rooms.leave}
+        memberships.update((room_id, "invite") for room_id in response.rooms.invite)
+        memberships.update((room_id, "join") for room_id in response.rooms.join)
+        syncs.record(response.next_batch, memberships, full=since is None)
+
+        self._events.add(self.timeline_messages(response))
+        record_presence(self.state_events(response))
+        for event in response.account_data_events:
+            if getattr(event, "type", None) == "m.direct":
+                self._direct_cache().replace(event.content)
+        return response
+
+    @staticmethod
+    def timeline_messages(response: SyncResponse) -> List[HistoryMessage]:
+        """Extract text messages from the joined-room timelines of a sync."""
+        messages: List[HistoryMessage] = []
+        for room_id, info in response.rooms.join.items():
+            for event in info.timeline.events:
+                if hasattr(event, "body"):
+                    messages.append(MatrixClient._history_message(room_id, event))
+        return messages
 
-        # Ensure proper format
+    @staticmethod
+    def state_events(response: SyncResponse) -> List[Dict[str, Any]]:
+        """Raw non-message events from a sync's joined rooms, oldest first."""
+        events: List[Dict[str, Any]] = []
+        for info in response.rooms.join.values():
+            for event in [*info.state, *info.timeline.events]:
+                if not hasattr(event, "body"):
+                    events.append(getattr(event, "source", {}))
+        return events
+
+    async def stream(
+        self,
+        targets: Iterable[str],
+        after: Optional[int] = None,
+        timeout: int = 30000,
+    ) -> AsyncIterator[Tuple[str, HistoryMessage]]:
+        """Yield ``(target, message)`` for messages arriving in the given rooms.
+
+        Long-polls incremental syncs, so messages arrive as soon as the server
+        has them. The first sync only catches up: of its messages, just those
+        newer than ``after`` (epoch ms) are yielded. A failed sync is retried
+        with exponential backoff, resuming from the last sync token.
+        """
+        targets = list(dict.fromkeys(targets))
+        await self.warm_aliases(t for t in targets if t.startswith("#"))
+        rooms: Dict[str, str] = {}
+        for target in targets:
+            room_id = await self.resolve_target(target)
+            if room_id:
+                rooms[room_id] = target
+            else:
+                log.warning("Could not resolve %s, not following it", target)
+
+        catching_up = True
+        delay = STREAM_RETRY_DELAY
+        while rooms:
+            try:
+                response = await self.sync_once(timeout=0 if catching_up else timeout)
+            except Exception as e:
+                log.warning("Sync failed, reconnecting in %.0fs: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, STREAM_MAX_RETRY_DELAY)
+                continue
+            delay = STREAM_RETRY_DELAY
+            for msg in self.timeline_messages(response):
+                if msg.room_id not in rooms:
+                    continue
+                if catching_up and (after is None or (msg.timestamp or 0) <= after):
+                    continue
+                yield rooms[msg.room_id], msg
+            catching_up = False
+
+    async def set_presence(self, status: str, message: str = "") -> bool:
+        """Publish this agent's presence as a state event in ``PRESENCE_ROOM``.
+
+        Returns False when the room won't take it, e.g. an older ``#status``
+        where members may not send state events.
+        """
+        room_id = await self.join_or_create_room(PRESENCE_ROOM)
+        if not room_id:
+            return False
+        client = await self._get_client()
+        user_id = client.user_id
+        content = presence_content(status, message)
+        response = await client.room_put_state(room_id, PRESENCE_EVENT, content, state_key=user_id)
+        if not isinstance(response, RoomPutStateResponse):
+            log.warning("Could not publish presence: %s", response)
+            return False
+        local = {**content, **local_fields()}
+        record_presence([
+            {"type": PRESENCE_EVENT, "state_key": user_id, "sender": user_id, "content": local}
+        ])
+        return True
+
+    async def fetch_presence(self) -> int:
+        """Read every agent's presence from ``PRESENCE_ROOM`` into the local cache."""
+        room_id = await self.resolve_room_alias(PRESENCE_ROOM)
+        if not room_id:
+            return 0
+        client = await self._get_client()
+        response = await client.room_get_state(room_id)
+        if not isinstance(response, RoomGetStateResponse):
+            raise RuntimeError(f"Could not read presence: {response}")
+        return record_presence(response.events)
+
+    def _full_alias(self, alias: str) -> str:
+        """Normalize ``general`` / ``#general`` to ``#general:server``."""
         if not alias.startswith("#"):
             alias = f"#{alias}"
         if ":" not in alias:
             alias = f"{alias}:{self._server_name}"
+        return alias
 
+    async def _lookup_alias(self, alias: str) -> Optional[str]:
+        """Ask the homeserver for an alias's room ID, bypassing the cache."""
+        client = await self._get_client()
         try:
             response = await client.room_resolve_alias(alias)
             if hasattr(response, "room_id"):
@@ -176,44 +404,215 @@ class MatrixClient:
             log.warning("Failed to resolve alias %s: %s", alias, e)
             return None
 
-    async def send_message(self, target: str, message: str) -> bool:
-        """Send a message to a room or user."""
+    async def resolve_room_alias(self, alias: str) -> Optional[str]:
+        """Resolve a room alias (#general) to room ID (!abc:server).
+
+        Answers come from the on-disk alias cache when possible.
+        """
+        alias = self._full_alias(alias)
+        room_id = self._aliases.get(alias)
+        if room_id:
+            return room_id
+
+        room_id = await self._lookup_alias(alias)
+        if room_id:
+            self._aliases.put(alias, room_id)
+        return room_id
+
+    async def warm_aliases(self, aliases: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Resolve many aliases at once, looking up cache misses concurrently."""
+        full = list(dict.fromkeys(self._full_alias(alias) for alias in aliases))
+        results = {alias: self._aliases.get(alias) for alias in full}
+        missing = [alias for alias, room_id in results.items() if not room_id]
+        if missing:
+            found = await asyncio.gather(*(self._lookup_alias(alias) for alias in missing))
+            resolved = {alias: room_id for alias, room_id in zip(missing, found) if room_id}
+            if resolved:
+                self._aliases.put_many(resolved)
+            results.update(zip(missing, found))
+        return results
+
+    def _forget_room(self, room_id: str, response: Any) -> bool:
+        """Drop cached aliases and membership for a room the server reports as
+        gone or off-limits.
+
+        Returns True when something was dropped, meaning a retry may resolve
+        the target to a different room or join it again.
+        """
+        if getattr(response, "status_code", None) not in STALE_ROOM_ERRORS:
+            return False
+        stale = self._aliases.invalidate_room(room_id)
+        if stale:
+            log.info("Dropped stale alias cache for %s: %s", room_id, ", ".join(stale))
+        syncs = self._sync_cache()
+        was_joined = syncs.rooms.get(room_id) == "join"
+        if was_joined:
+            log.info("No longer in %s, dropping it from the joined rooms", room_id)
+            syncs.set_membership(room_id, None)
+        return bool(stale) or was_joined
+
+    async def _ensure_joined(self, room_id: str) -> Any:
+        """Join a room unless the sync snapshot says we're already in it.
+
+        Returns the server's error response if the join failed, else None.
+        """
         client = await self._get_client()
+        syncs = self._sync_cache()
+        if syncs.rooms.get(room_id) == "join":
+            self._avoided_joins += 1
+            log.debug("Already in %s, skipped join (%d avoided)", room_id, self._avoided_joins)
+            return None
+        response = await client.join(room_id)
+        if isinstance(response, JoinResponse):
+            syncs.set_membership(room_id, "join")
+            return None
+        log.warning("Failed to join room %s: %s", room_id, response)
+        return response
 
-        # Resolve target to room ID
-        room_id = target
+    async def resolve_target(self, target: str) -> Optional[str]:
+        """Resolve a room alias, user ID or room ID to the room ID to talk to.
+
+        Users resolve to their DM room, which is created if needed.
+        """
         if target.startswith("#"):
-            resolved = await self.resolve_room_alias(target)
-            if resolved:
-                room_id = resolved
-            else:
-                raise ValueError(f"Could not resolve room alias: {target}")
-        elif target.startswith("@"):
-            # Direct message - need to find or create DM room
-            room_id = await self._get_or_create_dm_room(target)
+            return await self.resolve_room_alias(target)
+        if target.startswith("@"):
+            return await self._get_or_create_dm_room(target)
+        return target
 
-        # Ensure we're in the room
-        await client.join(room_id)
+    async def send_message(self, target: str, message: str) -> bool:
+        """Send a message to a room or user."""
+        room_id = await self.resolve_target(target)
+        if not room_id:
+            raise ValueError(f"Could not resolve room alias: {target}")
 
-        response = await client.room_send(
+        response = await self._send_text(room_id, message)
+        if not isinstance(response, RoomSendResponse) and self._forget_room(room_id, response):
+            # The cached alias pointed at a room we can't use; resolve it afresh
+            room_id = await self.resolve_target(target)
+            if room_id:
+                response = await self._send_text(room_id, message)
+
+        if isinstance(response, RoomSendResponse):
+            log.debug("Sent message to %s: %s", room_id, response.event_id)
+            return True
+        else:
+            log.error("Failed to send message: %s", response)
+            return False
+
+    async def _send_text(self, room_id: str, message: str, tx_id: Optional[str] = None) -> Any:
+        client = await self._get_client()
+        await self._ensure_joined(room_id)
+        return await client.room_send(
             room_id=room_id,
             message_type="m.room.message",
             content={
                 "msgtype": "m.text",
                 "body": message,
             },
+            tx_id=tx_id,
         )
 
-        if isinstance(response, RoomSendResponse):
-            log.debug("Sent message to %s: %s", room_id, response.event_id)
-            return True
-        else:
-            log.error("Failed to send message: %s", response)
-            return False
+    async def send_many(
+        self,
+        messages: Iterable[Tuple[str, str]],
+        concurrency: int = SEND_CONCURRENCY,
+        tx_ids: Optional[Iterable[Optional[str]]] = None,
+    ) -> List[SendResult]:
+        """Send ``(target, message)`` pairs and report a result for each.
+
+        Each target is resolved and joined once. Messages to one room go out
+        in order, different rooms concurrently, with at most ``concurrency``
+        sends in flight on the client's one connection pool. Every message
+        gets its own transaction ID (or the matching one from ``tx_ids``),
+        reused if the send is retried, so the server never posts it twice.
+        A failure only fails the message it hit: there is always one result
+        per message.
+        """
+        results = [SendResult(target, message) for target, message in messages]
+        for result, tx_id in zip(results, tx_ids or ()):
+            result.tx_id = tx_id
+        by_target: Dict[str, List[SendResult]] = {}
+        for result in results:
+            by_target.setdefault(result.target, []).append(result)
+        try:
+            await self.warm_aliases(t for t in by_target if t.startswith("#"))
+        except Exception as e:
+            # Each target is resolved again below and reports its own error
+            log.debug("Could not warm aliases: %s", e)
+        semaphore = asyncio.Semaphore(concurrency)
 
-    async def _get_or_create_dm_room(self, user_id: str) -> str:
-        """Get or create a DM room with a user."""
+        async def send_to(target: str, pending: List[SendResult]) -> None:
+            try:
+                room_id = await self.resolve_target(target)
+                error = f"Could not resolve room alias: {target}"
+            except Exception as e:
+                room_id, error = None, str(e)
+            if not room_id:
+                for result in pending:
+                    result.error = error
+                return
+
+            for result in pending:
+                result.tx_id = result.tx_id or str(uuid.uuid4())
+                try:
+                    async with semaphore:
+                        response = await self._send_text(room_id, result.message, result.tx_id)
+                        if not isinstance(response, RoomSendResponse) and self._forget_room(room_id, response):
+                            room_id = await self.resolve_target(target) or room_id
+                            response = await self._send_text(room_id, result.message, result.tx_id)
+                except Exception as e:
+                    result.error = str(e)
+                    continue
+                if isinstance(response, RoomSendResponse):
+                    result.event_id = response.event_id
+                else:
+                    result.error = str(response)
+                    result.retry_after_ms = getattr(response, "retry_after_ms", None)
+
+        await asyncio.gather(*(send_to(t, pending) for t, pending in by_target.items()))
+        sent = sum(result.ok for result in results)
+        log.debug("Sent %d of %d messages to %d rooms", sent, len(results), len(by_target))
+        return results
+
+    def _direct_cache(self) -> DirectCache:
+        if self._directs is None:
+            self._directs = DirectCache(self.user_id or "")
+        return self._directs
+
+    async def _get_direct_map(self) -> Dict[str, List[str]]:
+        """Fetch the account's ``m.direct`` map from the homeserver."""
+        client = await self._get_client()
+        response = await client.list_direct_rooms()
+        if isinstance(response, DirectRoomsResponse):
+            return dict(response.rooms)
+        # M_NOT_FOUND just means no DM has been recorded yet
+        if getattr(response, "status_code", None) == "M_NOT_FOUND":
+            return {}
+        raise RuntimeError(f"Failed to read m.direct: {response}")
+
+    async def _put_direct_map(self, direct_map: Dict[str, List[str]]) -> None:
         client = await self._get_client()
+        if hasattr(client, "set_account_data"):
+            # Newer matrix-nio releases can write account data themselves
+            response = await client.set_account_data("m.direct", direct_map)
+            if isinstance(response, ErrorResponse):
+                raise RuntimeError(f"Failed to update m.direct: {response}")
+            return
+        path = account_data_path(client.user_id, "m.direct", client.access_token)
+        response = await client.send("PUT", path, json.dumps(direct_map))
+        response.release()
+        if response.status != 200:
+            raise RuntimeError(f"Failed to update m.direct: HTTP {response.status}")
+
+    async def _get_or_create_dm_room(self, user_id: str) -> str:
+        """Get or create a DM room with a user.
+
+        Lookups are answered from the local copy of ``m.direct``; the server's
+        map is only fetched on a miss, and a newly created room is added to it.
+        """
+        # The local map is keyed by our user ID, known once the client exists
+        await self._get_client()
 
         # Ensure proper format
         if not user_id.startswith("@"):
@@ -221,23 +620,25 @@ class MatrixClient:
         if ":" not in user_id:
             user_id = f"{user_id}:{self._server_name}"
 
-        # Check existing rooms for DM with this user
-        response = await client.sync(timeout=0, full_state=True)
-        if isinstance(response, SyncResponse):
-            for room_id, room in response.rooms.join.items():
-                # Check room state for direct message with target user
-                try:
-                    state_response = await client.room_get_state(room_id)
-                    if hasattr(state_response, "events"):
-                        for event in state_response.events:
-                            # Look for m.room.member event for target user with is_direct
-                            if (event.get("type") == "m.room.member" and
-                                event.get("state_key") == user_id and
-                                event.get("content", {}).get("is_direct")):
-                                log.debug("Found existing DM room %s with %s", room_id, user_id)
-                                return room_id
-                except Exception as e:
-                    log.debug("Could not check state for %s: %s", room_id, e)
+        directs = self._direct_cache()
+        room_id = directs.get(user_id)
+        if room_id:
+            return room_id
+
+        # Another session may have opened the DM since we last looked
+        direct_map = await self._get_direct_map()
+        directs.replace(direct_map)
+        room_id = directs.get(user_id)
+        if room_id:
+            log.debug("Found existing DM room %s with %s", room_id, user_id)
+            return room_id
+
+        async with self._dm_lock:
+            return directs.get(user_id) or await self._create_dm_room(user_id)
+
+    async def _create_dm_room(self, user_id: str) -> str:
+        client = await self._get_client()
+        directs = self._direct_cache()
 
         # Create new DM room
         log.debug("Creating new DM room with %s", user_id)
@@ -246,80 +647,231 @@ class MatrixClient:
             invite=[user_id],
         )
 
-        if hasattr(room_response, "room_id"):
-            return room_response.room_id
-        else:
+        if not hasattr(room_response, "room_id"):
             raise RuntimeError(f"Failed to create DM room: {room_response}")
 
+        room_id = room_response.room_id
+        self._sync_cache().set_membership(room_id, "join")
+        # Re-read right before writing so a concurrent update isn't lost
+        direct_map = await self._get_direct_map()
+        direct_map.setdefault(user_id, [])
+        if room_id not in direct_map[user_id]:
+            direct_map[user_id].append(room_id)
+        try:
+            await self._put_direct_map(direct_map)
+        except Exception as e:
+            log.warning("Could not record DM room %s in m.direct: %s", room_id, e)
+        directs.put(user_id, room_id)
+        return room_id
+
     async def fetch_history(
         self,
         target: str,
         limit: int = 20,
+        after: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
     ) -> List[HistoryMessage]:
-        """Fetch message history from a room or DM."""
-        client = await self._get_client()
+        """Fetch message history from a room or DM, oldest first.
+
+        Without bounds this is the newest ``limit`` messages. ``after`` is a
+        lower bound: an event ID, or a token from ``history_token``. History
+        is then paged ``limit`` events at a time back to that event (or
+        forwards from that token) and every message newer than it is returned,
+        up to ``HISTORY_MAX_PAGES`` pages. ``since`` and ``until`` bound the
+        result by time, as in ``iter_history``.
+        """
+        messages: List[HistoryMessage] = []
+        if after and not after.startswith("$"):
+            pages = self._history_pages(target, limit, after, MessageDirection.front)
+            async with aclosing(pages):
+                async for room_id, page in pages:
+                    messages.extend(
+                        self._history_message(room_id, event)
+                        for event in page.chunk
+                        if hasattr(event, "body")
+                    )
+                    if len(messages) >= HISTORY_MAX_PAGES * limit:
+                        break
+            return messages
+
+        bounded = after is not None or since is not None
+        cap = HISTORY_MAX_PAGES * limit if bounded else limit
+        history = self.iter_history(target, since, until, stop_at=after, page_size=limit)
+        async with aclosing(history):
+            async for msg in history:
+                messages.append(msg)
+                if len(messages) >= cap:
+                    break
 
-        # Resolve target to room ID
-        room_id = target
-        if target.startswith("#"):
-            resolved = await self.resolve_room_alias(target)
-            if resolved:
-                room_id = resolved
-            else:
-                return []
-        elif target.startswith("@"):
-            # DM target - find the DM room
-            try:
-                room_id = await self._get_or_create_dm_room(target)
-            except Exception as e:
-                log.warning("Could not get DM room for %s: %s", target, e)
-                return []
+        # Return in chronological order (oldest first)
+        messages.reverse()
+        return messages
 
-        # Ensure we're in the room
+    async def iter_history(
+        self,
+        target: str,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        stop_at: Optional[str] = None,
+        page_size: int = 50,
+    ) -> AsyncIterator[HistoryMessage]:
+        """Yield a room's or DM's messages newest first, fetching pages lazily.
+
+        Messages newer than ``until`` are skipped, and iteration ends at the
+        first message older than ``since`` or at event ``stop_at``, which is
+        not yielded. Times are epoch milliseconds.
+        """
+        pages = self._history_pages(target, page_size)
+        async with aclosing(pages):
+            async for room_id, page in pages:
+                for event in page.chunk:
+                    if stop_at and event.event_id == stop_at:
+                        return
+                    if since is not None and event.server_timestamp < since:
+                        return
+                    if until is not None and event.server_timestamp > until:
+                        continue
+                    if hasattr(event, "body"):
+                        yield self._history_message(room_id, event)
+
+    async def _history_pages(
+        self,
+        target: str,
+        page_size: int,
+        start: str = "",
+        direction: MessageDirection = MessageDirection.back,
+    ) -> AsyncIterator[Tuple[str, RoomMessagesResponse]]:
+        """Yield ``(room_id, page)`` for a room or DM, following ``end`` tokens.
+
+        Also keeps ``history_token`` up to date for the target.
+        """
+        try:
+            room_id = await self.resolve_target(target)
+        except Exception as e:
+            log.warning("Could not get DM room for %s: %s", target, e)
+            return
+        if not room_id:
+            return
+
+        response = await self._room_messages(room_id, page_size, start, direction)
+        if not isinstance(response, RoomMessagesResponse) and self._forget_room(room_id, response):
+            room_id = await self.resolve_target(target)
+            if not room_id:
+                return
+            response = await self._room_messages(room_id, page_size, start, direction)
+        if not isinstance(response, RoomMessagesResponse):
+            return
+
+        # Backwards paging starts at the newest event; forwards paging ends there
+        forwards = direction == MessageDirection.front
+        self._history_tokens[target] = (response.end or start) if forwards else response.start
+        while True:
+            self._events.add(
+                self._history_message(room_id, event) for event in response.chunk if hasattr(event, "body")
+            )
+            yield room_id, response
+            if not response.chunk or not response.end:
+                return
+            response = await self._client.room_messages(
+                room_id=room_id,
+                start=response.end,
+                direction=direction,
+                limit=page_size,
+                message_filter=HISTORY_FILTER,
+            )
+            if not isinstance(response, RoomMessagesResponse):
+                log.warning("Stopped paging %s: %s", target, response)
+                return
+            if forwards and response.end:
+                self._history_tokens[target] = response.end
+
+    @staticmethod
+    def _history_message(room_id: str, event: Any) -> HistoryMessage:
+        return HistoryMessage(
+            room_id=room_id,
+            sender=event.sender,
+            text=event.body,
+            event_id=event.event_id,
+            timestamp=event.server_timestamp,
+        )
+
+    def history_token(self, target: str) -> Optional[str]:
+        """Pagination token at the newest event the last fetch of ``target`` saw."""
+        return self._history_tokens.get(target)
+
+    async def _room_messages(
+        self,
+        room_id: str,
+        limit: int,
+        start: str = "",
+        direction: MessageDirection = MessageDirection.back,
+    ) -> Any:
+        client = await self._get_client()
         try:
-            await client.join(room_id)
+            await self._ensure_joined(room_id)
         except Exception as e:
             log.warning("Failed to join room %s: %s", room_id, e)
 
-        response = await client.room_messages(
+        return await client.room_messages(
             room_id=room_id,
-            start="",  # Start from latest
+            start=start,  # "" starts from the latest event
+            direction=direction,
             limit=limit,
+            message_filter=HISTORY_FILTER,
         )
 
-        messages: List[HistoryMessage] = []
-        if isinstance(response, RoomMessagesResponse):
-            for event in response.chunk:
-                if hasattr(event, "body"):
-                    messages.append(
-                        HistoryMessage(
-                            room_id=room_id,
-                            sender=event.sender,
-                            text=event.body,
-                            event_id=event.event_id,
-                            timestamp=event.server_timestamp,
-                        )
-                    )
+    async def fetch_many(
+        self,
+        targets: Iterable[str],
+        limit: int = 20,
+        concurrency: int = FETCH_CONCURRENCY,
+        timeout: float = FETCH_TIMEOUT,
+        after: Optional[Dict[str, Optional[str]]] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> Dict[str, List[HistoryMessage]]:
+        """Fetch history for several rooms or DMs concurrently.
+
+        At most ``concurrency`` rooms are fetched at a time. A room that fails
+        or takes longer than ``timeout`` seconds is logged and left out of
+        the result, so callers get whatever arrived. ``after`` maps targets
+        to ``fetch_history`` lower bounds; ``since`` and ``until`` apply to
+        every target.
+        """
+        targets = list(dict.fromkeys(targets))
+        bounds = after or {}
+        await self.warm_aliases(t for t in targets if t.startswith("#"))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_one(target: str) -> List[HistoryMessage]:
+            async with semaphore:
+                return await asyncio.wait_for(
+                    self.fetch_history(
+                        target, limit, after=bounds.get(target), since=since, until=until
+                    ),
+                    timeout,
+                )
 
-        # Return in chronological order (oldest first)
-        messages.reverse()
-        return messages
+        fetched = await asyncio.gather(*(fetch_one(t) for t in targets), return_exceptions=True)
+        results: Dict[str, List[HistoryMessage]] = {}
+        for target, result in zip(targets, fetched):
+            if isinstance(result, BaseException):
+                log.warning("Skipping %s: %s", target, result or type(result).__name__)
+                continue
+            results[target] = result
+        return results
 
     async def get_joined_rooms(self) -> List[Dict[str, Any]]:
         """Get list of joined rooms with metadata."""
-        client = await self._get_client()
-
-        response = await client.sync(timeout=0, full_state=False)
-        rooms = []
-
-        if isinstance(response, SyncResponse):
-            for room_id in response.rooms.join:
-                rooms.append({
-                    "room_id": room_id,
-                    "name": room_id,  # Could fetch room state for name
-                })
-
-        return rooms
+        await self.sync_once(timeout=0)
+        return [
+            {
+                "room_id": room_id,
+                "name": room_id,  # Could fetch room state for name
+            }
+            for room_id in self._sync_cache().joined()
+        ]
 
     async def get_room_members(self, target: str) -> List[RoomMember]:
         """Get members of a room."""
@@ -364,10 +916,13 @@ class MatrixClient:
             alias=local_alias,
             visibility=RoomVisibility.public if public else RoomVisibility.private,
             topic=topic,
+            power_level_override=PRESENCE_POWER_LEVELS if f"#{local_alias}" == PRESENCE_ROOM else None,
         )
 
         if hasattr(response, "room_id"):
             log.info("Created room %s with alias #%s", response.room_id, local_alias)
+            self._sync_cache().set_membership(response.room_id, "join")
+            self._aliases.put(self._full_alias(local_alias), response.room_id)
             return response.room_id
         else:
             log.error("Failed to create room: %s", response)
@@ -379,8 +934,6 @@ class MatrixClient:
         topic: str = "",
     ) -> Optional[str]:
         """Join a room by alias, creating it if it doesn't exist."""
-        client = await self._get_client()
-
         # Clean up alias
         if not alias.startswith("#"):
             alias = f"#{alias}"
@@ -389,31 +942,23 @@ class MatrixClient:
         room_id = await self.resolve_room_alias(alias)
         if room_id:
             # Room exists, join it
-            await client.join(room_id)
+            error = await self._ensure_joined(room_id)
+            if error is not None and self._forget_room(room_id, error):
+                # The cached alias pointed at a room we can't use; resolve it afresh
+                room_id = await self.resolve_room_alias(alias)
+                if room_id:
+                    await self._ensure_joined(room_id)
+        if room_id:
             log.info("Joined existing room %s (%s)", alias, room_id)
             return room_id
 
-        # Room doesn't exist, create it
+        # Room doesn't exist, create it (which also joins it)
         log.info("Room %s doesn't exist, creating...", alias)
-        room_id = await self.create_room(alias, public=True, topic=topic)
-        if room_id:
-            await client.join(room_id)
-            return room_id
-
-        return None
-
-
-def run_sync(coro: Coroutine) -> Any:
-    """Run an async coroutine synchronously."""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-    return loop.run_until_complete(coro)
+        return await self.create_room(alias, public=True, topic=topic)
 
 
 def get_client(config: AgentChatConfig) -> MatrixClient:
-    """Create a new Matrix client instance."""
-    return MatrixClient(config)
+    """Create a new Matrix client instance, closed at exit if still open."""
+    from . import runner
+
+    return runner.track(MatrixClient(config))
@@ -1,21 +1,30 @@
-"""Configuration management for agent-chat."""
+"""Configuration management for agent-chat.
+
+Reads are side-effect free and cached per process: ``config.toml`` and
+``credentials.json`` are parsed again only when their modification time,
+size or inode changes, so commands can load configuration wherever they
+need it.
+"""
 from __future__ import annotations
 
+import copy
 import dataclasses
+import importlib
+import importlib.util
 import json
 import os
+import re
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
 import tomllib
-from filelock import FileLock
 
-try:
-    import keyring
-    KEYRING_AVAILABLE = True
-except ImportError:
-    keyring = None  # type: ignore
-    KEYRING_AVAILABLE = False
+from .locks import file_lock
+
+# keyring discovers its backends on import, which is slow; it is only needed
+# when credentials are written, so it is imported on first use.
+keyring = None
+KEYRING_AVAILABLE = importlib.util.find_spec("keyring") is not None
 
 APP_DIR = Path(os.environ.get("AGENT_CHAT_HOME", Path.home() / ".agent-chat"))
 CONFIG_FILE = APP_DIR / "config.toml"
@@ -23,6 +32,57 @@ CREDENTIALS_FILE = APP_DIR / "credentials.json"
 LOCK_FILE = CONFIG_FILE.with_suffix(".lock")
 SERVICE_NAME = "agent-chat"
 DEFAULT_ROOMS = ["#general", "#status", "#alerts"]
+# Names the agent session this process belongs to; per-session files are
+# kept apart so concurrent sessions on one host don't share them
+SESSION_ENV = "AGENT_CHAT_SESSION"
+
+
+# Parsed files by path: (stat signature, parsed value)
+_file_cache: Dict[Path, Tuple[Optional[Tuple[int, int, int]], Any]] = {}
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _cached_read(path: Path, parse: Callable[[Optional[bytes]], Any]) -> Any:
+    """``parse`` applied to the file's bytes (None if missing), cached until the file changes."""
+    signature = _signature(path)
+    cached = _file_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    try:
+        raw = path.read_bytes() if signature else None
+    except FileNotFoundError:
+        raw = None
+    value = parse(raw)
+    _file_cache[path] = (signature, value)
+    return value
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+    _file_cache.pop(path, None)
+
+
+def session_id() -> Optional[str]:
+    """This process's session name from ``AGENT_CHAT_SESSION``, safe as a file name.
+
+    hooks/session.sh derives the same name in the shell, so any change here
+    must be made there too.
+    """
+    raw = os.environ.get(SESSION_ENV, "").strip().encode()
+    value = re.sub(rb"[^A-Za-z0-9_.-]", b"-", raw).decode()
+    if not value.strip("."):
+        # "." and ".." would name the sessions directory or its parent
+        value = value.replace(".", "-")
+    return value or None
 
 
 @dataclasses.dataclass
@@ -46,12 +106,16 @@ class AgentChatConfig:
 
     @classmethod
     def load(cls) -> "AgentChatConfig":
-        """Load configuration from file or create defaults."""
-        APP_DIR.mkdir(parents=True, exist_ok=True)
-        if CONFIG_FILE.exists():
-            data = tomllib.loads(CONFIG_FILE.read_text())
-        else:
-            data = {}
+        """Load configuration, with defaults for anything unset.
+
+        Never writes: a missing file just means defaults. The parsed file is
+        cached, and each call returns a copy the caller may modify.
+        """
+        return copy.deepcopy(_cached_read(CONFIG_FILE, cls._parse))
+
+    @classmethod
+    def _parse(cls, raw: Optional[bytes]) -> "AgentChatConfig":
+        data = tomllib.loads(raw.decode("utf-8")) if raw else {}
 
         server_tbl = data.get("server", {})
         if not server_tbl:
@@ -61,7 +125,7 @@ class AgentChatConfig:
         if not identity_tbl:
             identity_tbl = {"username": "", "display_name": "Agent Chat"}
 
-        config = cls(
+        return cls(
             server=ServerConfig(
                 url=str(server_tbl.get("url", "http://localhost:8008")),
             ),
@@ -71,11 +135,6 @@ class AgentChatConfig:
             ),
         )
 
-        if not CONFIG_FILE.exists():
-            config.save()
-
-        return config
-
     def save(self) -> None:
         """Save configuration to file."""
         APP_DIR.mkdir(parents=True, exist_ok=True)
@@ -89,24 +148,44 @@ class AgentChatConfig:
             "",
         ]
         doc = "\n".join(lines)
-        with FileLock(str(LOCK_FILE)):
-            CONFIG_FILE.write_text(doc)
+        with file_lock(LOCK_FILE):
+            _atomic_write(CONFIG_FILE, doc)
 
 
-def get_credentials() -> Optional[Dict[str, Any]]:
-    """Get stored Matrix credentials (access_token, user_id, device_id)."""
-    if not CREDENTIALS_FILE.exists():
-        return None
+@dataclasses.dataclass
+class Profile:
+    """Configuration and stored credentials, read together."""
+    config: AgentChatConfig
+    credentials: Optional[Dict[str, Any]]
+
+
+def load_profile() -> Profile:
+    """Configuration and credentials in one pass over the (cached) files."""
+    return Profile(config=AgentChatConfig.load(), credentials=get_credentials())
 
-    with CREDENTIALS_FILE.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
 
+def _parse_credentials(raw: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    data = json.loads(raw)
     if "access_token" not in data:
         return None
-
     return data
 
 
+def get_credentials() -> Optional[Dict[str, Any]]:
+    """Get stored Matrix credentials (access_token, user_id, device_id)."""
+    creds = _cached_read(CREDENTIALS_FILE, _parse_credentials)
+    return dict(creds) if creds else None
+
+
+def _get_keyring() -> Any:
+    global keyring
+    if keyring is None:
+        keyring = importlib.import_module("keyring")
+    return keyring
+
+
 def set_credentials(
     user_id: str,
     access_token: str,
@@ -122,22 +201,22 @@ def set_credentials(
     }
 
     # Also try to store in keyring for extra security
-    if KEYRING_AVAILABLE and keyring is not None:
+    if KEYRING_AVAILABLE:
         try:
-            keyring.set_password(SERVICE_NAME, user_id, access_token)
+            _get_keyring().set_password(SERVICE_NAME, user_id, access_token)
         except Exception:
             pass  # Fall through to JSON storage
 
-    with FileLock(str(LOCK_FILE)):
-        with CREDENTIALS_FILE.open("w", encoding="utf-8") as fh:
-            json.dump(data, fh, indent=2)
+    with file_lock(LOCK_FILE):
+        _atomic_write(CREDENTIALS_FILE, json.dumps(data, indent=2))
 
 
 def clear_credentials() -> None:
     """Clear stored credentials."""
     if CREDENTIALS_FILE.exists():
-        with FileLock(str(LOCK_FILE)):
+        with file_lock(LOCK_FILE):
             CREDENTIALS_FILE.unlink()
+            _file_cache.pop(CREDENTIALS_FILE, None)
 
 
 # Legacy compatibility
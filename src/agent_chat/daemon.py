@@ -0,0 +1,326 @@
+"""Long-running agent-chat daemon serving CLI requests over a Unix socket.
+
+The daemon keeps a single authenticated ``MatrixClient`` open and runs an
+incremental long-poll sync loop, so ``ac`` commands can skip connection setup
+and credential loading. Requests and replies are single JSON lines::
+
+    {"op": "send", "args": {"target": "#general", "message": "hi"}}
+    {"ok": true, "result": true}
+"""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import os
+import signal
+import socket
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from . import spool
+from .config import APP_DIR
+from .logging import get_logger
+from .state import AgentChatState, layer_states
+from .unread import UnreadIndex, collect_unread, messages_after, notify_targets
+
+if TYPE_CHECKING:
+    from .client import MatrixClient
+
+SOCKET_PATH = APP_DIR / "daemon.sock"
+SYNC_TIMEOUT_MS = 30000
+SYNC_RETRY_DELAY = 5.0
+REQUEST_TIMEOUT = 30.0
+
+log = get_logger(__name__)
+
+
+class DaemonUnavailable(ConnectionError):
+    """No daemon is listening on the socket."""
+
+
+class DaemonError(RuntimeError):
+    """The daemon accepted a request but failed to handle it."""
+
+
+def request(op: str, timeout: float = REQUEST_TIMEOUT, **args: Any) -> Any:
+    """Send one request to a running daemon and return its result.
+
+    Raises ``DaemonUnavailable`` when no daemon can be reached, so callers can
+    fall back to talking to the homeserver directly, and ``DaemonError`` once
+    the request went out but no good reply came back (it may have been
+    carried out).
+    """
+    if not SOCKET_PATH.exists():
+        raise DaemonUnavailable(str(SOCKET_PATH))
+
+    payload = json.dumps({"op": op, "args": args}).encode() + b"\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(SOCKET_PATH))
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from e
+        try:
+            sock.sendall(payload)
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+        except OSError as e:
+            raise DaemonError(f"No reply from daemon to {op!r}: {e}") from e
+
+    if not line:
+        raise DaemonError(f"Daemon closed the connection during {op!r}")
+    try:
+        reply = json.loads(line)
+    except ValueError as e:
+        raise DaemonError(f"Malformed reply from daemon to {op!r}") from e
+    if not isinstance(reply, dict):
+        raise DaemonError(f"Malformed reply from daemon to {op!r}")
+    if not reply.get("ok"):
+        raise DaemonError(reply.get("error", "unknown error"))
+    return reply.get("result")
+
+
+def is_running() -> bool:
+    """Check whether a daemon answers on the socket."""
+    try:
+        request("ping", timeout=1.0)
+        return True
+    except (DaemonUnavailable, DaemonError, OSError):
+        return False
+
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class Daemon:
+    """Serve CLI requests from one persistent Matrix client."""
+
+    def __init__(self, client: "MatrixClient") -> None:
+        self._client = client
+        # room_id -> notify target (#channel or @user) for indexing sync events
+        self._targets: Dict[str, str] = {}
+        # Layers (None: shared, else a session) whose unread index has been
+        # scanned; only those have syncs folded into them
+        self._seeded: Set[Optional[str]] = set()
+        self._stopping = asyncio.Event()
+        # Set by the flush op to wake the spool flusher
+        self._flush_wake = asyncio.Event()
+        self._handlers: Dict[str, Handler] = {
+            "ping": self._ping,
+            "stop": self._stop,
+            "send": self._send,
+            "send_many": self._send_many,
+            "listen": self._listen,
+            "notify": self._notify,
+            "who": self._who,
+            "join": self._join,
+            "flush": self._flush,
+        }
+
+    async def serve(self) -> None:
+        """Run the socket server and sync loop until stopped."""
+        SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+        if SOCKET_PATH.exists():
+            if is_running():
+                raise RuntimeError(f"Daemon already running on {SOCKET_PATH}")
+            SOCKET_PATH.unlink()
+
+        server = await asyncio.start_unix_server(self._handle_connection, path=str(SOCKET_PATH))
+        os.chmod(SOCKET_PATH, 0o600)
+        log.info("Daemon listening on %s", SOCKET_PATH)
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        tasks = [asyncio.create_task(self._sync_loop()), asyncio.create_task(self._flush_loop())]
+        try:
+            async with server:
+                await self._stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._client.close()
+            try:
+                SOCKET_PATH.unlink()
+            except FileNotFoundError:
+                pass
+            log.info("Daemon stopped")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _sync_loop(self) -> None:
+        """Keep the client's view of the homeserver and every layer's unread index current."""
+        seeded = False
+        while not self._stopping.is_set():
+            try:
+                if not seeded:
+                    # Scan first, then fold in the initial sync: its timeline
+                    # overlaps the scan, but only what came after is counted.
+                    AgentChatState.load()
+                    layers = layer_states()
+                    await self._seed(layers)
+                    await self._track_rooms(layers)
+                    response = await self._client.sync_once(timeout=0)
+                    self._index_sync(response, layers)
+                    seeded = True
+                    continue
+                response = await self._client.sync_once(timeout=SYNC_TIMEOUT_MS)
+                layers = layer_states()
+                await self._track_rooms(layers)
+                self._index_sync(response, layers)
+                # Sessions that appeared since the last sync
+                await self._seed(layers)
+                log.debug("Synced to %s", response.next_batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Sync failed, retrying in %.0fs: %s", SYNC_RETRY_DELAY, e)
+                await asyncio.sleep(SYNC_RETRY_DELAY)
+
+    async def _flush_loop(self) -> None:
+        """Deliver the outbound spool whenever asked, and again as retries fall due."""
+        delay: Optional[float] = 0.0
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._flush_wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wake.clear()
+            try:
+                delay = await spool.flush(self._client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Spool flush failed, retrying in %.0fs: %s", SYNC_RETRY_DELAY, e)
+                delay = SYNC_RETRY_DELAY
+
+    async def _seed(self, layers: Dict[Optional[str], AgentChatState]) -> None:
+        """Scan the rooms of layers whose unread index hasn't been scanned yet."""
+        for session, state in layers.items():
+            if session not in self._seeded:
+                await collect_unread(self._client, state)
+                self._seeded.add(session)
+
+    async def _track_rooms(self, layers: Dict[Optional[str], AgentChatState]) -> None:
+        """Map channels and DMs newly subscribed in any layer to their room IDs."""
+        known = set(self._targets.values())
+        targets = list(dict.fromkeys(
+            t for state in layers.values() for t in notify_targets(state) if t not in known
+        ))
+        await self._client.warm_aliases(t for t in targets if t.startswith("#"))
+        for target in targets:
+            try:
+                room_id = await self._client.resolve_target(target)
+            except Exception as e:
+                log.warning("Could not resolve %s: %s", target, e)
+                continue
+            if room_id:
+                self._targets[room_id] = target
+
+    def _index_sync(self, response: Any, layers: Dict[Optional[str], AgentChatState]) -> None:
+        """Fold the new messages from one sync into each scanned layer's unread index.
+
+        Messages up to a room's ``last_event_id`` were already counted (or
+        read), so only those after it are recorded.
+        """
+        own_id = self._client.user_id
+        by_target: Dict[str, List[Any]] = {}
+        for msg in self._client.timeline_messages(response):
+            if msg.room_id in self._targets:
+                by_target.setdefault(self._targets[msg.room_id], []).append(msg)
+        synced_at = time.time()
+        for session, state in layers.items():
+            if session not in self._seeded:
+                continue
+            targets = set(notify_targets(state))
+            with UnreadIndex.edit(session) as index:
+                for target, messages in by_target.items():
+                    if target not in targets:
+                        continue
+                    entry = index.rooms.get(target)
+                    for msg in messages_after(messages, entry.last_event_id if entry else None):
+                        if msg.sender != own_id:
+                            index.record(target, msg)
+                index.synced_at = synced_at
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            reply = await self._dispatch(line)
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        except Exception as e:
+            log.warning("Daemon connection failed: %s", e)
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line: bytes) -> Dict[str, Any]:
+        try:
+            msg = json.loads(line)
+            op = msg["op"]
+            handler = self._handlers[op]
+        except (ValueError, KeyError, TypeError):
+            return {"ok": False, "error": "malformed request"}
+
+        try:
+            result = await handler(**msg.get("args", {}))
+        except Exception as e:
+            log.warning("Daemon %s failed: %s", op, e)
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "result": result}
+
+    async def _ping(self) -> Dict[str, Any]:
+        return {"pid": os.getpid()}
+
+    async def _stop(self) -> bool:
+        self._stopping.set()
+        return True
+
+    async def _flush(self) -> bool:
+        self._flush_wake.set()
+        return True
+
+    async def _send(self, target: str, message: str) -> bool:
+        return await self._client.send_message(target, message)
+
+    async def _send_many(self, messages: list[list[str]]) -> list[Dict[str, Any]]:
+        results = await self._client.send_many((target, message) for target, message in messages)
+        return [dataclasses.asdict(result) for result in results]
+
+    async def _listen(
+        self,
+        targets: list[str],
+        limit: int = 20,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> Dict[str, list[Dict[str, Any]]]:
+        history = await self._client.fetch_many(targets, limit, since=since, until=until)
+        return {
+            target: [dataclasses.asdict(msg) for msg in messages]
+            for target, messages in history.items()
+        }
+
+    async def _notify(self, session: Optional[str] = None) -> Dict[str, Dict[str, object]]:
+        results = await collect_unread(self._client, AgentChatState.for_session(session))
+        self._seeded.add(session)
+        return results
+
+    async def _who(self, room: str) -> list[Dict[str, Any]]:
+        members = await self._client.get_room_members(room)
+        return [dataclasses.asdict(member) for member in members]
+
+    async def _join(self, room: str, topic: str = "") -> Optional[str]:
+        return await self._client.join_or_create_room(room, topic=topic)
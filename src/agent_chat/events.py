@@ -0,0 +1,158 @@
+"""Local store of room messages for agent-chat.
+
+Every message the client sees, through history fetches or sync, is kept in
+``EVENTS_DB``: SQLite in WAL mode, so readers never block the daemon's
+writes, with an FTS5 index over message bodies. ``ac search`` and
+``ac listen --cached`` answer from it without touching the network.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Iterable, List, Optional
+
+from .config import APP_DIR
+from .logging import get_logger
+from .models import HistoryMessage
+
+EVENTS_DB = APP_DIR / "events.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    body TEXT NOT NULL,
+    ts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_room_ts ON events (room_id, ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5 (
+    body, content='events', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS events_ai AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, body) VALUES (new.rowid, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS events_ad AFTER DELETE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, body) VALUES ('delete', old.rowid, old.body);
+END;
+"""
+
+log = get_logger(__name__)
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching all of its words.
+
+    Each word is quoted, so prefixes like ``[HANDOFF]`` can't trip the FTS5
+    query syntax.
+    """
+    words = text.split()
+    return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+class EventStore:
+    """Messages keyed by event ID, indexed by room, time and body text."""
+
+    def __init__(self) -> None:
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            EVENTS_DB.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(EVENTS_DB, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def add(self, messages: Iterable[HistoryMessage]) -> None:
+        rows = [
+            (msg.event_id, msg.room_id, msg.sender, msg.text, msg.timestamp or 0)
+            for msg in messages
+            if msg.event_id
+        ]
+        if not rows:
+            return
+        try:
+            with self._db() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO events (event_id, room_id, sender, body, ts)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            # The store is a cache; never fail a send or fetch over it
+            log.warning("Could not store %d events: %s", len(rows), e)
+
+    def history(
+        self,
+        room_id: str,
+        limit: int = 20,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[HistoryMessage]:
+        """Stored messages for a room, oldest first: the newest ``limit`` in range."""
+        return self._select("", [], room_id=room_id, limit=limit, since=since, until=until)
+
+    def search(
+        self,
+        text: str,
+        room_id: Optional[str] = None,
+        sender: Optional[str] = None,
+        since: Optional[int] = None,
+        limit: int = 50,
+    ) -> List[HistoryMessage]:
+        """The newest ``limit`` messages containing every word of ``text``, oldest first.
+
+        ``sender`` is a full user ID or just the nick.
+        """
+        join = "JOIN events_fts ON events_fts.rowid = events.rowid"
+        clauses = ["events_fts MATCH ?"]
+        params: List[object] = [fts_query(text)]
+        if sender:
+            if ":" in sender:
+                clauses.append("sender = ?")
+                params.append(sender)
+            else:
+                # The nick is matched literally, so escape LIKE's wildcards
+                nick = re.sub(r"([\\%_])", r"\\\1", sender.lstrip("@"))
+                clauses.append("sender LIKE ? ESCAPE '\\'")
+                params.append(f"@{nick}:%")
+        return self._select(join, clauses, params=params, room_id=room_id, limit=limit, since=since)
+
+    def _select(
+        self,
+        join: str,
+        clauses: List[str],
+        params: Optional[List[object]] = None,
+        room_id: Optional[str] = None,
+        limit: int = 20,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[HistoryMessage]:
+        params = list(params or [])
+        if room_id:
+            clauses = clauses + ["room_id = ?"]
+            params.append(room_id)
+        if since is not None:
+            clauses = clauses + ["ts >= ?"]
+            params.append(since)
+        if until is not None:
+            clauses = clauses + ["ts <= ?"]
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            "SELECT events.event_id, events.room_id, events.sender, events.body, events.ts"
+            f" FROM events {join} {where} ORDER BY events.ts DESC LIMIT ?"
+        )
+        rows = self._db().execute(query, [*params, limit]).fetchall()
+        return [
+            HistoryMessage(room_id=room, sender=sender, text=body, event_id=event_id, timestamp=ts)
+            for event_id, room, sender, body, ts in reversed(rows)
+        ]
@@ -0,0 +1,239 @@
+"""Claude Code hook workflows run in a single process.
+
+The scripts in ``hooks/`` used to shell out to ``ac`` for every step, paying
+interpreter startup and a fresh homeserver login each time. These functions
+run a whole hook with one ``MatrixClient`` and issue independent calls
+concurrently. Announcements go through the outbound spool, so a slow
+homeserver never holds up the agent. Run them with ``ac hook <event>`` or
+``python -m agent_chat.hooks <event>``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Coroutine, Dict, List, Optional, Tuple
+
+from . import spool
+from .client import HistoryMessage, MatrixClient, get_client
+from .config import AgentChatConfig
+from .logging import get_logger
+from .presence import PRESENCE_TTL, expires_at, get_presence
+from .runner import run
+from .state import AgentChatState
+from .unread import UnreadIndex, messages_after
+
+ALERTS_ROOM = "#alerts"
+STATUS_ROOM = "#status"
+# What a hook prints when it can't run at all: never block the agent on chat
+DEGRADED_OUTPUT: Dict[str, str] = {"stop": json.dumps({"decision": "allow"})}
+
+log = get_logger(__name__)
+
+
+def get_project(cwd: Optional[str] = None) -> str:
+    """Detect project name from the working directory, sanitized as a channel name."""
+    project = os.path.basename(cwd or os.getcwd()).lower()
+    project = re.sub(r'[^a-z0-9-]', '-', project)
+    project = re.sub(r'-+', '-', project)
+    project = project.strip('-')
+    return project or "default"
+
+
+def format_messages(messages: List[HistoryMessage]) -> str:
+    lines = []
+    for msg in messages:
+        time_str = ""
+        if msg.timestamp:
+            time_str = datetime.fromtimestamp(msg.timestamp / 1000).strftime("%H:%M") + " "
+        nick = msg.sender.split(":")[0].lstrip("@")
+        lines.append(f"{time_str}{nick}: {msg.text}")
+    return "\n".join(lines)
+
+
+class HookRunner:
+    """Run hook workflows against one Matrix client."""
+
+    def __init__(self, client: MatrixClient, nick: str) -> None:
+        self._client = client
+        self._nick = nick
+
+    async def _send(self, target: str, message: str) -> bool:
+        """Queue a message; ``run_hook`` starts delivery once the hook is done."""
+        spool.enqueue(target, message)
+        return True
+
+    async def _set_presence(self, status: str, message: str) -> bool:
+        """Publish presence to #status, or queue a chat line if the room won't take it."""
+        try:
+            if await self._client.set_presence(status, message):
+                return True
+        except Exception as e:
+            log.warning("Hook could not publish presence: %s", e)
+        try:
+            return await self._send(STATUS_ROOM, f"[{status.upper()}] @{self._nick} | {message}")
+        except Exception as e:
+            log.warning("Hook could not queue presence: %s", e)
+            return False
+
+    async def _renew_presence(self) -> bool:
+        """Republish our presence once half its lease is gone, so we stay listed.
+
+        Presence that lapsed while the agent was idle is restored; presence
+        the agent set to offline itself is left alone.
+        """
+        info = get_presence(self._nick)
+        if info.get("status") == "offline":
+            info = info.get("resume") or {}
+        if not info.get("status") or info.get("status") == "offline":
+            return False
+        if expires_at(info) - time.time() > PRESENCE_TTL / 2:
+            return False
+        return await self._set_presence(info["status"], info.get("message", ""))
+
+    async def _join_and_announce(self, project: str) -> bool:
+        try:
+            room_id = await self._client.join_or_create_room(f"#{project}")
+        except Exception as e:
+            log.warning("Hook could not join #%s: %s", project, e)
+            return False
+        try:
+            if room_id:
+                AgentChatState.load().ensure_subscription(f"#{project}")
+            return await self._send(f"#{project}", f"[ONLINE] @{self._nick} joined")
+        except Exception as e:
+            log.warning("Hook could not announce in #%s: %s", project, e)
+            return False
+
+    async def _alerts(self, limit: int) -> Tuple[int, List[HistoryMessage]]:
+        """Count unread alerts and return the latest ``limit`` alert messages.
+
+        One ``/messages`` call serves both; the unread index is used for the
+        count when a daemon keeps it current. If the homeserver can't be
+        reached, only the index can tell (and without a live one, nothing).
+        """
+        state = AgentChatState.load()
+        index = UnreadIndex.load(state.session)
+        try:
+            messages = await self._client.fetch_history(ALERTS_ROOM, max(limit, 20))
+        except Exception as e:
+            log.warning("Hook could not fetch %s: %s", ALERTS_ROOM, e)
+            messages = []
+        if index.is_live():
+            count = index.rooms[ALERTS_ROOM].count if ALERTS_ROOM in index.rooms else 0
+        else:
+            entry = state.channels.get(ALERTS_ROOM)
+            unread = messages_after(messages, entry.msgid if entry else None)
+            count = sum(msg.sender != self._client.user_id for msg in unread)
+        return count, messages[-limit:]
+
+    def _mark_alerts_read(self, messages: List[HistoryMessage]) -> None:
+        if not messages:
+            return
+        state = AgentChatState.load()
+        state.touch_channel(ALERTS_ROOM, messages[-1].event_id)
+        with UnreadIndex.edit(state.session) as index:
+            index.mark_read(ALERTS_ROOM, messages[-1].event_id)
+
+    async def session_start(self) -> str:
+        project = get_project()
+        _, _, (count, alerts) = await asyncio.gather(
+            self._join_and_announce(project),
+            self._set_presence("online", f"Project: {project}"),
+            self._alerts(10),
+        )
+
+        out = []
+        if count > 0:
+            self._mark_alerts_read(alerts)
+            out.append(f"\n⚠️ URGENT MESSAGES ({count} in {ALERTS_ROOM}):")
+            out.append(format_messages(alerts))
+            out.append("Review these before starting work.\n")
+        out.append(f"\n📁 Project channel: #{project}")
+        out.append(
+            "Use /chat to message your project channel, or #general "
+            "for cross-project coordination.\n"
+        )
+        return "\n".join(out)
+
+    async def user_prompt_submit(self) -> str:
+        _, (count, alerts) = await asyncio.gather(self._renew_presence(), self._alerts(5))
+        if count <= 0:
+            return ""
+        self._mark_alerts_read(alerts)
+        return "\n".join([
+            f"\n!! URGENT ({count} unread in {ALERTS_ROOM}):",
+            format_messages(alerts),
+            "Consider addressing these before continuing.\n",
+        ])
+
+    async def stop(self) -> str:
+        count, _ = await self._alerts(1)
+        if count > 0:
+            output: Dict[str, str] = {
+                "decision": "block",
+                "reason": f"!! {count} unread messages in {ALERTS_ROOM}. "
+                          f"Run `/listen {ALERTS_ROOM}` before stopping.",
+            }
+        else:
+            await self._set_presence("offline", "session ended")
+            output = {"decision": "allow"}
+        return json.dumps(output)
+
+
+HOOK_EVENTS: Dict[str, Callable[[HookRunner], Coroutine[None, None, str]]] = {
+    "session-start": HookRunner.session_start,
+    "user-prompt-submit": HookRunner.user_prompt_submit,
+    "stop": HookRunner.stop,
+}
+
+
+def run_hook(event: str) -> str:
+    """Run the workflow for a hook event and return what it should print.
+
+    A failing hook is logged and prints ``DEGRADED_OUTPUT`` rather than
+    crashing the agent's hook.
+    """
+    if event not in HOOK_EVENTS:
+        raise ValueError(f"Unknown hook event: {event} (use one of {', '.join(HOOK_EVENTS)})")
+
+    try:
+        config = AgentChatConfig.load()
+        client = get_client(config)
+        runner = HookRunner(client, config.identity.username or "agent")
+
+        async def do_hook():
+            try:
+                return await HOOK_EVENTS[event](runner)
+            finally:
+                await client.close()
+
+        output = run(do_hook())
+    except Exception as e:
+        log.warning("Hook %s failed: %s", event, e)
+        output = DEGRADED_OUTPUT.get(event, "")
+    try:
+        if spool.pending():
+            spool.kick()
+    except Exception as e:
+        log.warning("Hook could not start delivery: %s", e)
+    return output
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 1:
+        print(f"usage: python -m agent_chat.hooks {{{','.join(HOOK_EVENTS)}}}", file=sys.stderr)
+        return 2
+    output = run_hook(args[0])
+    if output:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""Inter-process file locks for the files under APP_DIR."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from filelock import BaseFileLock
+
+
+def file_lock(path: Union[str, Path], timeout: float = -1) -> "BaseFileLock":
+    """Return a lock on ``path``.
+
+    filelock pulls in asyncio on import, so it is imported here on first use
+    rather than at module load; read-only commands never pay for it.
+    """
+    from filelock import FileLock
+
+    return FileLock(str(path), timeout=timeout)
@@ -4,7 +4,7 @@ import logging
 from logging.handlers import RotatingFileHandler
 from typing import Optional
 
-from .config import APP_DIR
+from .config import APP_DIR, session_id
 
 LOG_DIR = APP_DIR / "logs"
 LOG_FILE = LOG_DIR / "ac.log"
@@ -18,7 +18,10 @@ def setup_logging(verbose: bool = False) -> None:
             logger.removeHandler(handler)
     logger.setLevel(logging.DEBUG if verbose else logging.INFO)
 
-    handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=3)
+    # Each session rotates its own file; a shared one would be rotated under its feet
+    session = session_id()
+    log_file = LOG_FILE.with_name(f"{LOG_FILE.stem}-{session}{LOG_FILE.suffix}") if session else LOG_FILE
+    handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
     formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
     handler.setFormatter(formatter)
     logger.addHandler(handler)
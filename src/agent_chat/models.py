@@ -0,0 +1,42 @@
+"""Plain data types shared by the client, daemon and CLI.
+
+Kept free of nio imports so commands that never reach the homeserver can use
+them without paying for the Matrix client at startup.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class HistoryMessage:
+    """A message from room history."""
+    room_id: str
+    sender: str
+    text: str
+    event_id: Optional[str]
+    timestamp: Optional[int]
+
+
+@dataclass
+class RoomMember:
+    """A member of a room."""
+    user_id: str
+    display_name: Optional[str]
+
+
+@dataclass
+class SendResult:
+    """Outcome of one message sent by ``MatrixClient.send_many``."""
+    target: str
+    message: str
+    event_id: Optional[str] = None
+    error: Optional[str] = None
+    tx_id: Optional[str] = None
+    # Set when the server rate-limited the send
+    retry_after_ms: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.event_id is not None
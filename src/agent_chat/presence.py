@@ -1,44 +1,280 @@
-"""Presence tracking for agent-chat."""
+"""Presence tracking for agent-chat.
+
+Each agent publishes its presence as a ``PRESENCE_EVENT`` state event in
+``#status``, keyed by its user ID, so every node sees every agent without
+the room filling up with status chatter. Syncs mirror those events locally
+and ``ac presence-list`` only reads the local copy.
+
+Locally, every update is one JSON line appended to ``PRESENCE_LOG``: a
+heartbeat costs a single ``O_APPEND`` write and takes no lock. Readers fold
+the log over the ``PRESENCE_FILE`` snapshot, newest entry per agent
+winning. Once the log passes ``COMPACT_BYTES`` the writer that noticed
+folds it into a new snapshot; only compaction takes ``PRESENCE_LOCK``.
+
+Every entry holds a lease (``expires_at``, epoch seconds). A min-heap of
+leases, kept in the snapshot, lets each read expire just the entries that
+are due: an agent whose lease runs out goes offline, and an offline agent
+is dropped once its ``OFFLINE_RETENTION`` lease runs out too.
+"""
+import heapq
 import json
 import os
-from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Optional
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from filelock import FileLock
+from .config import APP_DIR
+from .locks import file_lock
 
-PRESENCE_FILE = Path.home() / ".agent-chat" / "presence.json"
-PRESENCE_LOCK = Path.home() / ".agent-chat" / "presence.json.lock"
+PRESENCE_FILE = APP_DIR / "presence.json"
+PRESENCE_LOG = APP_DIR / "presence.log"
+PRESENCE_LOCK = APP_DIR / "presence.json.lock"
+PRESENCE_EVENT = "dev.agent-chat.presence"
+PRESENCE_ROOM = "#status"
+# Log size at which an append triggers compaction
+COMPACT_BYTES = 64 * 1024
+# Seconds an update keeps an agent present; hooks renew it as the agent works
+PRESENCE_TTL = 15 * 60
+# Seconds an agent stays listed as offline before it is dropped
+OFFLINE_RETENTION = 24 * 60 * 60
+EXPIRED_MESSAGE = "lease expired"
 
+Agents = Dict[str, Dict[str, Any]]
 
-def load_presence() -> dict:
-    """Load presence data from file."""
-    if not PRESENCE_FILE.exists():
-        return {"agents": {}}
+
+def _compacting_log():
+    """Where compaction moves the log while folding it into the snapshot."""
+    return PRESENCE_LOG.with_name(PRESENCE_LOG.name + ".1")
+
+
+def _read_records(path) -> List[Dict[str, Any]]:
+    try:
+        lines = path.read_bytes().splitlines()
+    except FileNotFoundError:
+        return []
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A torn final line from a crashed writer
+            continue
+        if isinstance(record, dict) and record.get("nick"):
+            records.append(record)
+    return records
+
+
+def expires_at(info: Dict[str, Any]) -> float:
+    """An entry's lease end; entries from before leases get ``PRESENCE_TTL``."""
+    try:
+        return float(info["expires_at"])
+    except (KeyError, TypeError, ValueError):
+        return last_seen(info).timestamp() + PRESENCE_TTL
+
+
+def _fold(agents: Agents, heap: List[List[Any]], records: Iterable[Dict[str, Any]]) -> None:
+    """Apply log records to ``agents``; per agent the newest ``last_seen`` wins."""
+    for record in records:
+        nick = record["nick"]
+        current = agents.get(nick)
+        if current is not None and last_seen(record) < last_seen(current):
+            continue
+        info = {k: v for k, v in record.items() if k != "nick"}
+        agents[nick] = info
+        if not info.get("removed"):
+            heapq.heappush(heap, [expires_at(info), nick])
+
+
+def _expire(agents: Agents, heap: List[List[Any]], now: float) -> Agents:
+    """Move agents whose lease is up along (present -> offline -> removed).
+
+    Pops only the due leases off ``heap``; a popped lease the agent has
+    since renewed is skipped. Returns the transitions made.
+    """
+    transitions: Agents = {}
+    while heap and heap[0][0] <= now:
+        lease, nick = heapq.heappop(heap)
+        info = agents.get(nick)
+        if info is None or info.get("removed") or expires_at(info) != lease:
+            continue
+        if info.get("status") == "offline":
+            info = {"removed": True, "last_seen": info.get("last_seen")}
+        else:
+            info = {
+                **info,
+                "status": "offline",
+                "message": EXPIRED_MESSAGE,
+                "expires_at": lease + OFFLINE_RETENTION,
+                # What to restore should the agent turn out to be working
+                "resume": {"status": info.get("status"), "message": info.get("message", "")},
+            }
+            heapq.heappush(heap, [info["expires_at"], nick])
+        agents[nick] = transitions[nick] = info
+    return transitions
+
+
+def _load_state() -> Tuple[Agents, List[List[Any]]]:
+    """The snapshot's agents and lease heap with the log folded in.
+
+    The live log is read first, then the one set aside, then the snapshot:
+    whenever a compaction running meanwhile moves records on (log -> aside
+    -> snapshot), we read them at their next stop if not before.
+    """
+    live = _read_records(PRESENCE_LOG)
+    records = _read_records(_compacting_log()) + live
     try:
-        return json.loads(PRESENCE_FILE.read_text())
-    except (json.JSONDecodeError, OSError):
-        return {"agents": {}}
+        data = json.loads(PRESENCE_FILE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    agents = data.get("agents", {})
+    heap = data.get("expiry")
+    if not isinstance(heap, list):
+        heap = [[expires_at(info), nick] for nick, info in agents.items()]
+        heapq.heapify(heap)
+    _fold(agents, heap, records)
+    return agents, heap
+
+
+def load_presence() -> dict:
+    """Current presence: the snapshot with the log folded over it.
+
+    Leases that ran out are expired on the way, and the transitions are
+    appended to the log so later readers don't repeat them.
+    """
+    agents, heap = _load_state()
+    transitions = _expire(agents, heap, time.time())
+    if transitions:
+        append_presence(transitions)
+    return {"agents": {nick: info for nick, info in agents.items() if not info.get("removed")}}
 
 
 def save_presence(data: dict) -> None:
-    """Save presence data to file."""
+    """Save a presence snapshot, with its lease heap, replacing the file atomically."""
+    agents = {nick: info for nick, info in data["agents"].items() if not info.get("removed")}
+    heap = [[expires_at(info), nick] for nick, info in agents.items()]
+    heapq.heapify(heap)
     PRESENCE_FILE.parent.mkdir(parents=True, exist_ok=True)
-    PRESENCE_FILE.write_text(json.dumps(data, indent=2))
+    tmp = PRESENCE_FILE.with_name(f"{PRESENCE_FILE.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"agents": agents, "expiry": heap}))
+    os.replace(tmp, PRESENCE_FILE)
+
+
+def append_presence(entries: Dict[str, Dict[str, Any]]) -> None:
+    """Append one record per agent to the log, compacting it when it has grown."""
+    payload = b"".join(
+        json.dumps({"nick": nick, **info}, separators=(",", ":")).encode() + b"\n"
+        for nick, info in entries.items()
+    )
+    PRESENCE_LOG.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(PRESENCE_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, payload)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if size >= COMPACT_BYTES:
+        compact(wait=False)
+
+
+def compact(wait: bool = True) -> bool:
+    """Fold the log into the snapshot. Returns False if another process is at it.
+
+    The log is renamed aside first, so appends carry on into a fresh one.
+    A crash part way leaves the renamed log in place; readers still fold it
+    and the next compaction picks it up.
+    """
+    from filelock import Timeout
+
+    try:
+        with file_lock(PRESENCE_LOCK, timeout=5 if wait else 0):
+            aside = _compacting_log()
+            if not aside.exists():
+                try:
+                    os.replace(PRESENCE_LOG, aside)
+                except FileNotFoundError:
+                    return True
+            agents, heap = _load_state()
+            _expire(agents, heap, time.time())
+            save_presence({"agents": agents})
+            aside.unlink()
+            return True
+    except Timeout:
+        return False
+
+
+def presence_content(status: str, message: str = "") -> Dict[str, Any]:
+    """The state event content announcing this agent's presence.
+
+    Everything here is published to ``PRESENCE_ROOM``; see ``local_fields``
+    for what stays on this machine.
+    """
+    now = time.time()
+    ttl = OFFLINE_RETENTION if status == "offline" else PRESENCE_TTL
+    return {
+        "status": status,
+        "message": message,
+        "last_seen": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        "expires_at": now + ttl,
+        "host": socket.gethostname(),
+    }
+
+
+def local_fields() -> Dict[str, Any]:
+    """Fields only the local cache keeps, never published: they expose local paths."""
+    return {"cwd": os.getcwd()}
+
+
+def last_seen(info: Dict[str, Any]) -> datetime:
+    """When an entry was last updated, as an aware datetime (naive means local time)."""
+    try:
+        return datetime.fromisoformat(info["last_seen"]).astimezone()
+    except (KeyError, TypeError, ValueError):
+        return datetime.min.replace(tzinfo=timezone.utc)
+
+
+def nick_for(user_id: str) -> str:
+    return user_id.split(":")[0].lstrip("@")
+
+
+def record_presence(events: Iterable[Dict[str, Any]]) -> int:
+    """Fold raw ``PRESENCE_EVENT`` state events into the cache.
+
+    Other events are skipped, as are presence events an agent didn't send
+    about itself (``state_key`` must be the sender), so nobody can set
+    another agent's presence. An entry is only replaced by a newer one, so
+    replaying old state is harmless. Returns the number of agents updated.
+    """
+    updates: Dict[str, Dict[str, Any]] = {}
+    for event in events:
+        content = event.get("content") or {}
+        user_id = event.get("state_key")
+        if event.get("type") != PRESENCE_EVENT or not user_id or user_id != event.get("sender"):
+            continue
+        info = {**content, "user_id": user_id}
+        nick = nick_for(user_id)
+        if "status" in content and last_seen(info) >= last_seen(updates.get(nick, {})):
+            updates[nick] = info
+    if not updates:
+        return 0
+
+    agents = load_presence()["agents"]
+    changed = {
+        nick: info for nick, info in updates.items()
+        if last_seen(info) >= last_seen(agents.get(nick, {}))
+    }
+    if changed:
+        append_presence(changed)
+    return len(changed)
 
 
 def update_presence(nick: str, status: str, message: str = "") -> dict:
-    """Update presence for an agent (with file locking for multi-agent safety)."""
-    with FileLock(PRESENCE_LOCK, timeout=5):
-        data = load_presence()
-        data["agents"][nick] = {
-            "status": status,
-            "message": message,
-            "last_seen": datetime.now().isoformat(),
-            "cwd": os.getcwd()
-        }
-        save_presence(data)
-        return data["agents"][nick]
+    """Update presence for an agent: one append to the log."""
+    info = {**presence_content(status, message), **local_fields()}
+    append_presence({nick: info})
+    return info
 
 
 def get_presence(nick: Optional[str] = None) -> dict:
@@ -49,22 +285,17 @@ def get_presence(nick: Optional[str] = None) -> dict:
     return data["agents"]
 
 
-def clear_stale(max_age_minutes: int = 15) -> int:
-    """Remove agents not seen in max_age_minutes (with file locking)."""
-    with FileLock(PRESENCE_LOCK, timeout=5):
-        data = load_presence()
-        now = datetime.now()
-        cutoff = timedelta(minutes=max_age_minutes)
-
-        stale_nicks = [
-            nick for nick, info in data["agents"].items()
-            if now - datetime.fromisoformat(info["last_seen"]) > cutoff
-        ]
-
-        for nick in stale_nicks:
-            del data["agents"][nick]
-
-        if stale_nicks:
-            save_presence(data)
+def clear_stale() -> int:
+    """Drop offline agents now rather than when their retention runs out.
 
-        return len(stale_nicks)
+    Agents whose lease has run out are already offline; this appends a
+    removal record for each offline agent. A newer update brings it back.
+    """
+    offline = {
+        nick: {"removed": True, "last_seen": info.get("last_seen")}
+        for nick, info in load_presence()["agents"].items()
+        if info.get("status") == "offline"
+    }
+    if offline:
+        append_presence(offline)
+    return len(offline)
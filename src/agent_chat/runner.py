@@ -0,0 +1,78 @@
+"""Event loop management for agent-chat.
+
+Each process runs its async work on one ``asyncio.Runner``: the loop is
+created on first use, reused by every later ``run`` call, and closed at exit
+once the clients handed out by ``get_client`` are shut down. uvloop is used
+when it is installed, unless ``AGENT_CHAT_LOOP=asyncio``.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import os
+import weakref
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, List, Optional, TypeVar
+
+from .logging import get_logger
+
+if TYPE_CHECKING:
+    from .client import MatrixClient
+
+T = TypeVar("T")
+
+log = get_logger(__name__)
+
+_runner: Optional[asyncio.Runner] = None
+_clients: "weakref.WeakSet[MatrixClient]" = weakref.WeakSet()
+
+
+def loop_factory() -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """uvloop's loop constructor when it is installed and allowed, else None."""
+    if os.environ.get("AGENT_CHAT_LOOP", "").lower() == "asyncio":
+        return None
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+
+def get_runner() -> asyncio.Runner:
+    """The process-wide runner, created on first use."""
+    global _runner
+    if _runner is None:
+        _runner = asyncio.Runner(loop_factory=loop_factory())
+        atexit.register(shutdown)
+    return _runner
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine to completion on the shared loop."""
+    return get_runner().run(coro)
+
+
+def track(client: "MatrixClient") -> "MatrixClient":
+    """Have ``shutdown`` close ``client`` if it is still open by then."""
+    _clients.add(client)
+    return client
+
+
+def shutdown() -> None:
+    """Close tracked clients, then the loop. Safe to call more than once."""
+    global _runner
+    if _runner is None:
+        return
+    runner, _runner = _runner, None
+    clients = list(_clients)
+    _clients.clear()
+    try:
+        if clients:
+            runner.run(_close_all(clients))
+    except Exception as e:
+        log.debug("Error closing clients at shutdown: %s", e)
+    finally:
+        runner.close()
+
+
+async def _close_all(clients: List["MatrixClient"]) -> None:
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
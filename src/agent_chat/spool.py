@@ -0,0 +1,209 @@
+"""Outbound message spool for agent-chat.
+
+``enqueue`` writes a message to ``SPOOL_DIR`` and returns straight away, so
+hooks never wait on the homeserver. ``flush`` delivers what is queued: the
+``#alerts`` lane first, ``#status`` chatter last, and everything else in the
+order it was queued. A message keeps the transaction ID it was queued with,
+so resending it after a timeout or crash can't post it twice.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+
+from .config import APP_DIR
+from .locks import file_lock
+from .logging import get_logger
+from .models import SendResult
+
+if TYPE_CHECKING:
+    from .client import MatrixClient
+
+SPOOL_DIR = APP_DIR / "outbox"
+SPOOL_LOCK = APP_DIR / "outbox.lock"
+# Held by a standalone flusher (``ac flush``) for as long as it runs
+FLUSHER_LOCK = APP_DIR / "outbox.flusher.lock"
+# Lower lanes are delivered first
+LANES = {"#alerts": 0, "#status": 2}
+DEFAULT_LANE = 1
+MAX_ATTEMPTS = 8
+RETRY_BASE_DELAY = 2.0
+# Seconds a flush waits for a rate limit before leaving the rest for later
+MAX_RATE_LIMIT_WAIT = 10.0
+# Seconds to wait when another process is already flushing
+BUSY_DELAY = 1.0
+
+log = get_logger(__name__)
+
+
+@dataclass
+class QueuedMessage:
+    target: str
+    message: str
+    tx_id: str
+    queued_at: float
+    attempts: int = 0
+    # Epoch seconds before which the message isn't retried
+    not_before: float = 0.0
+    path: Optional[Path] = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["QueuedMessage"]:
+        try:
+            raw = json.loads(path.read_text())
+            return cls(path=path, **raw)
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("Skipping unreadable spool entry %s: %s", path.name, e)
+            return None
+
+    def save(self) -> None:
+        data = asdict(self)
+        del data["path"]
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+
+
+def enqueue(target: str, message: str) -> QueuedMessage:
+    """Queue a message for delivery and return without touching the network."""
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    lane = LANES.get(target, DEFAULT_LANE)
+    queued = QueuedMessage(target, message, tx_id=str(uuid.uuid4()), queued_at=time.time())
+    # File names sort by lane, then by queue time
+    queued.path = SPOOL_DIR / f"{lane}-{time.time_ns():020d}-{queued.tx_id}.json"
+    queued.save()
+    return queued
+
+
+def pending() -> List[QueuedMessage]:
+    """Queued messages in delivery order."""
+    if not SPOOL_DIR.exists():
+        return []
+    messages = (QueuedMessage.load(path) for path in sorted(SPOOL_DIR.glob("*.json")))
+    return [msg for msg in messages if msg is not None]
+
+
+def _give_up(msg: QueuedMessage, error: Optional[str]) -> None:
+    failed = SPOOL_DIR / "failed"
+    failed.mkdir(exist_ok=True)
+    os.replace(msg.path, failed / msg.path.name)
+    log.warning("Gave up sending to %s after %d attempts: %s", msg.target, msg.attempts, error)
+
+
+async def flush(client: "MatrixClient") -> Optional[float]:
+    """Deliver every due message once.
+
+    Messages to a target stay in order: after a failure, later messages to
+    the same target wait for the next flush. Returns the seconds until the
+    next queued message is due, or None when the queue is empty.
+    """
+    from filelock import Timeout
+
+    try:
+        with file_lock(SPOOL_LOCK, timeout=0):
+            return await _flush_locked(client)
+    except Timeout:
+        return BUSY_DELAY
+
+
+async def _flush_locked(client: "MatrixClient") -> Optional[float]:
+    held: Set[str] = set()
+    sent = 0
+    messages = pending()
+    for msg in messages:
+        if msg.target in held or msg.not_before > time.time():
+            held.add(msg.target)
+            continue
+
+        while True:
+            try:
+                [result] = await client.send_many([(msg.target, msg.message)], tx_ids=[msg.tx_id])
+            except Exception as e:
+                result = SendResult(msg.target, msg.message, error=str(e))
+            wait = (result.retry_after_ms or 0) / 1000
+            if result.ok or not result.retry_after_ms or wait > MAX_RATE_LIMIT_WAIT:
+                break
+            log.debug("Rate limited, waiting %.1fs", wait)
+            await asyncio.sleep(wait)
+
+        if result.ok:
+            msg.path.unlink(missing_ok=True)
+            sent += 1
+            continue
+        msg.attempts += 1
+        if msg.attempts >= MAX_ATTEMPTS:
+            _give_up(msg, result.error)
+            continue
+        msg.not_before = time.time() + max(wait, RETRY_BASE_DELAY * 2 ** (msg.attempts - 1))
+        msg.save()
+        held.add(msg.target)
+
+    if sent:
+        log.debug("Flushed %d of %d queued messages", sent, len(messages))
+    # Each target is due when its oldest message is
+    due: Dict[str, float] = {}
+    for msg in pending():
+        due.setdefault(msg.target, msg.not_before)
+    if not due:
+        return None
+    return max(0.0, min(due.values()) - time.time())
+
+
+async def drain(client: "MatrixClient") -> None:
+    """Flush until the queue is empty, sleeping while messages back off.
+
+    Returns at once if another process is already draining; it picks up
+    whatever was queued since.
+    """
+    from filelock import Timeout
+
+    try:
+        with file_lock(FLUSHER_LOCK, timeout=0):
+            while (delay := await flush(client)) is not None:
+                await asyncio.sleep(delay)
+    except Timeout:
+        log.debug("Another process is already draining the queue")
+
+
+def flusher_running() -> bool:
+    """Whether a standalone flusher is draining the queue."""
+    from filelock import Timeout
+
+    try:
+        with file_lock(FLUSHER_LOCK, timeout=0):
+            return False
+    except Timeout:
+        return True
+
+
+def kick() -> None:
+    """Make sure something is delivering the queue.
+
+    A running daemon is asked to flush; otherwise, unless a flusher is
+    already at it, a detached ``python -m agent_chat flush`` is started so
+    the caller can exit at once.
+    """
+    from . import daemon
+
+    try:
+        daemon.request("flush", timeout=1.0)
+        return
+    except (daemon.DaemonUnavailable, daemon.DaemonError, OSError):
+        pass
+    if flusher_running():
+        return
+    subprocess.Popen(
+        [sys.executable, "-m", "agent_chat", "flush"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
@@ -1,16 +1,36 @@
+"""Per-agent chat state: subscriptions and the last message read per room.
+
+Changes are tracked per room and written behind: ``save`` re-reads the
+file under its lock and merges in only the rooms this process changed, so
+concurrent ``ac`` calls don't undo each other. Inside ``with
+state.batch():`` any number of changes cost one write.
+
+With ``AGENT_CHAT_SESSION`` set, a process reads and writes its own shard
+under ``SESSIONS_DIR``, laid over the shared ``STATE_FILE``: it sees the
+shared subscriptions but keeps its own read markers and subscription
+changes, and only ever takes its own shard's lock.
+"""
 from __future__ import annotations
 
 import json
+import os
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Dict, Optional
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
-from filelock import FileLock
 
-from .config import APP_DIR, DEFAULT_ROOMS
+from .config import APP_DIR, DEFAULT_ROOMS, session_id
+from .locks import file_lock
 
 STATE_FILE = APP_DIR / "state.json"
 STATE_LOCK = STATE_FILE.with_suffix(".lock")
+SESSIONS_DIR = APP_DIR / "sessions"
+
+
+def shard_file(session: str) -> Path:
+    return SESSIONS_DIR / session / "state.json"
 
 
 def _now_iso() -> str:
@@ -42,64 +62,196 @@ class AgentChatState:
     channels: Dict[str, LastSeenEntry]
     directs: Dict[str, LastSeenEntry]
     subscribed_channels: list[str]
+    # The session whose shard this is a view of (None: the shared state)
+    session: Optional[str] = field(default=None, compare=False)
+    # Shared subscriptions a session has dropped; only stored in shards
+    _unsubscribed: List[str] = field(default_factory=list, repr=False, compare=False)
+    # Changes not yet written: room names per section, and (channel, subscribed)
+    # subscription changes in the order they were made
+    _dirty_channels: Set[str] = field(default_factory=set, repr=False, compare=False)
+    _dirty_directs: Set[str] = field(default_factory=set, repr=False, compare=False)
+    _subscriptions: List[Tuple[str, bool]] = field(default_factory=list, repr=False, compare=False)
+    _batch_depth: int = field(default=0, repr=False, compare=False)
 
     @classmethod
     def load(cls) -> "AgentChatState":
+        """This process's state: the shared file, or its session's shard over it."""
+        return cls.for_session(session_id())
+
+    @classmethod
+    def for_session(cls, session: Optional[str]) -> "AgentChatState":
+        """The state ``session`` sees (None: the shared state)."""
         APP_DIR.mkdir(parents=True, exist_ok=True)
-        if not STATE_FILE.exists():
-            state = cls(
+        shared = cls._read(STATE_FILE)
+        if shared is None:
+            shared = cls(
                 channels={ch: LastSeenEntry() for ch in DEFAULT_ROOMS},
                 directs={},
                 subscribed_channels=DEFAULT_ROOMS.copy(),
             )
-            state.save()
-            return state
-        with FileLock(str(STATE_LOCK)):
-            data = json.loads(STATE_FILE.read_text())
+            with file_lock(STATE_LOCK):
+                if not STATE_FILE.exists():
+                    shared._write(STATE_FILE)
+        if not session:
+            return shared
+        shard = cls._read(shard_file(session)) or cls({}, {}, [])
+        return cls._overlay(shared, shard, session)
+
+    @classmethod
+    def _overlay(cls, shared: "AgentChatState", shard: "AgentChatState", session: str) -> "AgentChatState":
+        hidden = set(shard._unsubscribed)
+        subscribed = [ch for ch in shared.subscribed_channels if ch not in hidden]
+        subscribed += [ch for ch in shard.subscribed_channels if ch not in subscribed]
+        return cls(
+            channels={**shared.channels, **shard.channels},
+            directs={**shared.directs, **shard.directs},
+            subscribed_channels=subscribed,
+            session=session,
+        )
+
+    @classmethod
+    def _read(cls, path: Path) -> Optional["AgentChatState"]:
+        # Writes replace the file atomically, so reads don't need the lock
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
         last_seen = data.get("last_seen", {})
         channels_raw = last_seen.get("channels", {})
         directs_raw = last_seen.get("direct", {}) or last_seen.get("directs", {})
         channels = {name: LastSeenEntry.from_raw(val) for name, val in channels_raw.items()}
         directs = {name: LastSeenEntry.from_raw(val) for name, val in directs_raw.items()}
         subs = data.get("subscribed_channels", DEFAULT_ROOMS)
-        return cls(channels=channels, directs=directs, subscribed_channels=list(subs))
+        return cls(
+            channels=channels,
+            directs=directs,
+            subscribed_channels=list(subs),
+            _unsubscribed=list(data.get("unsubscribed", [])),
+        )
 
-    def save(self) -> None:
-        payload = {
+    def _write(self, path: Path) -> None:
+        payload: Dict[str, object] = {
             "last_seen": {
                 "channels": {name: entry.to_raw() for name, entry in self.channels.items()},
                 "direct": {name: entry.to_raw() for name, entry in self.directs.items()},
             },
             "subscribed_channels": self.subscribed_channels,
         }
-        with FileLock(str(STATE_LOCK)):
-            STATE_FILE.write_text(json.dumps(payload, indent=2))
+        if self._unsubscribed:
+            payload["unsubscribed"] = self._unsubscribed
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, path)
+
+    def save(self) -> None:
+        """Merge this process's changes into its file on disk and write it once.
+
+        Rooms and subscriptions nobody here touched keep whatever other
+        processes wrote; afterwards this object reflects the merged state.
+        A session only writes its shard, never the shared file.
+        """
+        if not self.is_dirty():
+            return
+        path = shard_file(self.session) if self.session else STATE_FILE
+        with file_lock(path.with_suffix(".lock") if self.session else STATE_LOCK):
+            merged = self._read(path) or AgentChatState({}, {}, [])
+            for name in self._dirty_channels:
+                merged.channels[name] = self.channels[name]
+            for name in self._dirty_directs:
+                merged.directs[name] = self.directs[name]
+            for channel, subscribed in self._subscriptions:
+                if subscribed:
+                    if channel not in merged.subscribed_channels:
+                        merged.subscribed_channels.append(channel)
+                    if channel in merged._unsubscribed:
+                        merged._unsubscribed.remove(channel)
+                else:
+                    if channel in merged.subscribed_channels:
+                        merged.subscribed_channels.remove(channel)
+                    if self.session and channel not in merged._unsubscribed:
+                        merged._unsubscribed.append(channel)
+            merged._write(path)
+        if self.session:
+            merged = self._overlay(self._read(STATE_FILE) or merged, merged, self.session)
+        self.channels = merged.channels
+        self.directs = merged.directs
+        self.subscribed_channels = merged.subscribed_channels
+        self._dirty_channels.clear()
+        self._dirty_directs.clear()
+        self._subscriptions.clear()
+        # Read markers or subscriptions changed, so the status line may be
+        # stale: a shard only affects its own, the shared state every layer's
+        from .unread import UnreadIndex, write_notify_file, write_notify_files
+
+        if self.session:
+            write_notify_file(UnreadIndex.load(self.session), self)
+        else:
+            write_notify_files()
+
+    def is_dirty(self) -> bool:
+        return bool(self._dirty_channels or self._dirty_directs or self._subscriptions)
+
+    @contextmanager
+    def batch(self) -> Iterator["AgentChatState"]:
+        """Hold changes back and write them all at once when the block ends."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.save()
+
+    def _changed(self) -> None:
+        if not self._batch_depth:
+            self.save()
 
     def touch_channel(self, name: str, msgid: Optional[str] = None) -> None:
         self.channels[name] = LastSeenEntry(timestamp=_now_iso(), msgid=msgid)
-        self.save()
+        self._dirty_channels.add(name)
+        self._changed()
 
     def touch_direct(self, target: str, msgid: Optional[str] = None) -> None:
-        if target not in self.directs:
-            self.directs[target] = LastSeenEntry()
         self.directs[target] = LastSeenEntry(timestamp=_now_iso(), msgid=msgid)
-        self.save()
+        self._dirty_directs.add(target)
+        self._changed()
 
     def ensure_subscription(self, channel: str) -> None:
         if channel not in self.subscribed_channels:
             self.subscribed_channels.append(channel)
+            self._subscriptions.append((channel, True))
         if channel not in self.channels:
             self.channels[channel] = LastSeenEntry()
-        self.save()
+            self._dirty_channels.add(channel)
+        self._changed()
 
     def remove_subscription(self, channel: str) -> None:
         if channel in self.subscribed_channels:
             self.subscribed_channels.remove(channel)
-            self.save()
+            self._subscriptions.append((channel, False))
+            self._changed()
 
     def ensure_direct(self, target: str) -> None:
         if not target.startswith("@"):
             target = f"@{target}"
         if target not in self.directs:
             self.directs[target] = LastSeenEntry()
-            self.save()
+            self._dirty_directs.add(target)
+            self._changed()
+
+
+def layer_states() -> Dict[Optional[str], AgentChatState]:
+    """The state each layer sees: ``None`` for the shared one, then each session's view."""
+    shared = AgentChatState._read(STATE_FILE) or AgentChatState({}, {}, [])
+    layers: Dict[Optional[str], AgentChatState] = {None: shared}
+    # A session is a layer once it has a shard or anything else in its directory
+    for path in sorted(p for p in SESSIONS_DIR.glob("*") if p.is_dir()):
+        shard = AgentChatState._read(path / "state.json") or AgentChatState({}, {}, [])
+        layers[path.name] = AgentChatState._overlay(shared, shard, path.name)
+    return layers
+
+
+def session_subscriptions() -> Dict[Optional[str], List[str]]:
+    """Subscribed channels per layer: ``None`` for the shared one, then each session's view."""
+    return {session: state.subscribed_channels for session, state in layer_states().items()}
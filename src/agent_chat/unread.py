@@ -0,0 +1,297 @@
+"""Unread message tracking for agent-chat.
+
+``UnreadIndex`` keeps a per-room unread count next to ``state.json`` so that
+``ac notify`` can answer without talking to the homeserver. The daemon keeps
+it current from its sync loop; without a daemon, ``notify`` rescans the rooms
+and refreshes the index as it goes.
+
+Counts depend on read markers, so like the state there is one index per
+layer: ``UNREAD_FILE`` for the shared state and one in each session's
+directory under ``SESSIONS_DIR``.
+
+Whenever an index or the read state changes, the one-line summary is
+rewritten to the layer's ``NOTIFY_FILE``, so the status hook only has to
+read a file. Its first line is the epoch second after which
+the counts can't be trusted.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+
+from .config import APP_DIR, session_id
+from .locks import file_lock
+from . import state as state_mod
+from .state import AgentChatState, layer_states
+
+if TYPE_CHECKING:
+    from .client import MatrixClient
+    from .models import HistoryMessage
+
+UNREAD_FILE = APP_DIR / "unread.json"
+UNREAD_LOCK = UNREAD_FILE.with_suffix(".lock")
+# A daemon long-polls for at most 30s, so an index older than this has no
+# live writer and may be missing messages.
+LIVE_MAX_AGE = 90.0
+NOTIFY_FILE = APP_DIR / "notify.txt"
+# Seconds counts from a scan (rather than a live daemon) are shown for
+NOTIFY_TTL = 30.0
+# How often ``wait_for_change`` looks at the notify file
+WAIT_INTERVAL = 0.5
+
+
+def is_urgent(text: str) -> bool:
+    return text.lower().startswith("!urgent")
+
+
+def messages_after(messages: List["HistoryMessage"], msgid: Optional[str]) -> List["HistoryMessage"]:
+    """Return the messages newer than ``msgid`` (all of them if it isn't found)."""
+    if not msgid:
+        return messages
+    for index, msg in enumerate(messages):
+        if msg.event_id == msgid:
+            return messages[index + 1:]
+    return messages
+
+
+@dataclass
+class UnreadEntry:
+    count: int = 0
+    urgent: bool = False
+    last_event_id: Optional[str] = None
+    # Pagination token at ``last_event_id``, so the next scan only reads
+    # newer events. Cleared whenever the entry changes any other way.
+    token: Optional[str] = None
+
+    @classmethod
+    def from_raw(cls, raw: object) -> "UnreadEntry":
+        if not isinstance(raw, dict):
+            return cls()
+        return cls(
+            count=int(raw.get("count", 0)),
+            urgent=bool(raw.get("urgent", False)),
+            last_event_id=raw.get("last_event_id"),
+            token=raw.get("token"),
+        )
+
+    def to_raw(self) -> Dict[str, object]:
+        data: Dict[str, object] = {"count": self.count, "urgent": self.urgent}
+        if self.last_event_id:
+            data["last_event_id"] = self.last_event_id
+        if self.token:
+            data["token"] = self.token
+        return data
+
+
+def unread_file(session: Optional[str]) -> Path:
+    return UNREAD_FILE if session is None else state_mod.SESSIONS_DIR / session / UNREAD_FILE.name
+
+
+@dataclass
+class UnreadIndex:
+    rooms: Dict[str, UnreadEntry] = field(default_factory=dict)
+    # Last time a daemon folded a sync into the index (epoch seconds).
+    synced_at: float = 0.0
+    # Last time collect_unread rescanned the rooms (epoch seconds).
+    scanned_at: float = 0.0
+    # The layer this index counts for (None: the shared state)
+    session: Optional[str] = field(default=None, compare=False)
+
+    @classmethod
+    def load(cls, session: Optional[str] = None) -> "UnreadIndex":
+        """Read a layer's index without locking; writes replace the file atomically."""
+        try:
+            data = json.loads(unread_file(session).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls(session=session)
+        rooms = {name: UnreadEntry.from_raw(raw) for name, raw in data.get("rooms", {}).items()}
+        return cls(
+            rooms=rooms,
+            synced_at=float(data.get("synced_at", 0.0)),
+            scanned_at=float(data.get("scanned_at", 0.0)),
+            session=session,
+        )
+
+    @classmethod
+    @contextmanager
+    def edit(cls, session: Optional[str] = None) -> Iterator["UnreadIndex"]:
+        """Load, modify and save a layer's index under its lock."""
+        path = unread_file(session)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(path.with_suffix(".lock") if session else UNREAD_LOCK):
+            index = cls.load(session)
+            yield index
+            index.save()
+
+    def save(self) -> None:
+        payload = {
+            "synced_at": self.synced_at,
+            "scanned_at": self.scanned_at,
+            "rooms": {name: entry.to_raw() for name, entry in self.rooms.items()},
+        }
+        path = unread_file(self.session)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, path)
+        write_notify_file(self, AgentChatState.for_session(self.session))
+
+    def expires_at(self) -> float:
+        """When the counts stop being trustworthy without a new sync or scan."""
+        if self.is_live():
+            return self.synced_at + LIVE_MAX_AGE
+        return self.scanned_at + NOTIFY_TTL
+
+    def is_live(self) -> bool:
+        """Whether a daemon has updated the index recently enough to trust it."""
+        return time.time() - self.synced_at < LIVE_MAX_AGE
+
+    def record(self, target: str, message: "HistoryMessage") -> None:
+        entry = self.rooms.setdefault(target, UnreadEntry())
+        entry.count += 1
+        entry.urgent = entry.urgent or is_urgent(message.text)
+        entry.last_event_id = message.event_id
+        entry.token = None
+
+    def mark_read(self, target: str, event_id: Optional[str] = None) -> None:
+        self.rooms[target] = UnreadEntry(last_event_id=event_id)
+
+    def summary(self, targets: Optional[List[str]] = None) -> Dict[str, Dict[str, object]]:
+        """Counts in the shape ``ac notify --json`` prints."""
+        results: Dict[str, Dict[str, object]] = {}
+        for name in targets if targets is not None else list(self.rooms):
+            entry = self.rooms.get(name, UnreadEntry())
+            results[name] = {"count": entry.count, "urgent": entry.urgent}
+        return results
+
+
+def format_notify(
+    results: Dict[str, Dict[str, object]],
+    json_output: bool = False,
+    oneline: bool = False,
+) -> str:
+    """Render unread counts the way ``ac notify`` prints them."""
+    if json_output:
+        return json.dumps(results)
+    if oneline:
+        parts = [
+            f"{key}({data['count']}{'!' if data.get('urgent') else ''})"
+            for key, data in results.items()
+            if data.get("count", 0) > 0
+        ]
+        return "[chat] " + " ".join(parts) if parts else ""
+    lines = []
+    for key, data in results.items():
+        count = data.get("count", 0)
+        if count > 0:
+            urgent = " (URGENT)" if data.get("urgent") else ""
+            lines.append(f"{key}: {count} new messages{urgent}")
+    return "\n".join(lines)
+
+
+def notify_file(session: Optional[str]) -> Path:
+    return NOTIFY_FILE if session is None else state_mod.SESSIONS_DIR / session / NOTIFY_FILE.name
+
+
+def write_notify_file(index: UnreadIndex, state: AgentChatState) -> None:
+    """Rewrite the status-line summary for the layer ``index`` counts for."""
+    path = notify_file(index.session)
+    line = format_notify(index.summary(notify_targets(state)), oneline=True)
+    text = f"{int(index.expires_at())}\n{line}\n"
+    try:
+        if path.read_text() == text:
+            return
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def write_notify_files() -> None:
+    """Rewrite the status-line summary for the shared state and every session."""
+    for session, state in layer_states().items():
+        write_notify_file(UnreadIndex.load(session), state)
+
+
+def read_notify_file(path: Path) -> Optional[str]:
+    """The summary line from a notify file, or None if there isn't one."""
+    try:
+        lines = path.read_text().splitlines()
+    except FileNotFoundError:
+        return None
+    return lines[1] if len(lines) > 1 else ""
+
+
+def wait_for_change(timeout: Optional[float] = None) -> bool:
+    """Block until this session's status line changes. False if ``timeout`` ran out.
+
+    Only the notify file is watched, so the homeserver is never asked; a
+    daemon, or any ``ac`` command that reads or marks messages, rewrites it.
+    """
+    path = notify_file(session_id())
+    if read_notify_file(path) is None:
+        write_notify_files()
+    current = read_notify_file(path)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while deadline is None or time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        if read_notify_file(path) != current:
+            return True
+    return False
+
+
+def notify_targets(state: AgentChatState) -> List[str]:
+    """Every room ``notify`` reports on: subscribed channels, then DMs."""
+    return list(state.subscribed_channels) + list(state.directs)
+
+
+async def collect_unread(
+    client: "MatrixClient",
+    state: AgentChatState,
+) -> Dict[str, Dict[str, object]]:
+    """Count unread messages for every subscribed channel and DM.
+
+    Scans the homeserver, all rooms concurrently, and stores the counts in
+    the unread index of the layer ``state`` belongs to. A room scanned before is read forwards from where that
+    scan stopped; otherwise history is paged back to the last read message,
+    so counts are exact however many messages arrived. Our own messages
+    aren't counted, as in the daemon's live index.
+    """
+    targets = notify_targets(state)
+    previous = UnreadIndex.load(state.session).rooms
+    bounds: Dict[str, Optional[str]] = {}
+    for target in targets:
+        entry = previous.get(target)
+        seen = state.channels.get(target) or state.directs.get(target)
+        if entry and entry.token:
+            bounds[target] = entry.token
+        else:
+            bounds[target] = seen.msgid if seen else None
+    history = await client.fetch_many(targets, 20, after=bounds)
+    own_id = client.user_id
+
+    entries: Dict[str, UnreadEntry] = {}
+    for target, messages in history.items():
+        entry = previous.get(target)
+        # Reading on from a token adds to what the earlier scan counted
+        base = entry if entry and entry.token else UnreadEntry()
+        unread = [m for m in messages if m.sender != own_id]
+        entries[target] = UnreadEntry(
+            count=base.count + len(unread),
+            urgent=base.urgent or any(is_urgent(m.text) for m in unread),
+            last_event_id=messages[-1].event_id if messages else base.last_event_id,
+            token=client.history_token(target),
+        )
+
+    # Rooms that timed out keep their previous counts
+    with UnreadIndex.edit(state.session) as index:
+        index.rooms.update(entries)
+        index.scanned_at = time.time()
+        return index.summary(targets)
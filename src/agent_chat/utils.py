@@ -2,12 +2,16 @@ from __future__ import annotations
 
 import random
 import re
+import time
+from datetime import datetime
 from pathlib import Path
 
 from .words import ADJECTIVES, NOUNS
 
 CHANNEL_PATTERN = re.compile(r"^#")
 DM_PATTERN = re.compile(r"^@")
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
 
 
 def is_channel(target: str) -> bool:
@@ -24,6 +28,18 @@ def generate_nick() -> str:
     return f"{first}{second}"
 
 
+def parse_time(value: str) -> int:
+    """Parse ``2h`` / ``30m`` (that long ago) or an ISO time to epoch milliseconds."""
+    match = DURATION_PATTERN.match(value.strip())
+    if match:
+        seconds = float(match.group(1)) * DURATION_UNITS[match.group(2)]
+        return int((time.time() - seconds) * 1000)
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        raise ValueError(f"Expected a duration like 2h or an ISO time, got {value!r}") from None
+
+
 def ensure_executable(path: Path) -> None:
     mode = path.stat().st_mode
     path.chmod(mode | 0o111)
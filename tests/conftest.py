@@ -1,8 +1,14 @@
 import pytest
 
+from agent_chat import cache as cache_mod
 from agent_chat import config as config_mod
+from agent_chat import daemon as daemon_mod
+from agent_chat import events as events_mod
 from agent_chat import state as state_mod
 from agent_chat import logging as logging_mod
+from agent_chat import presence as presence_mod
+from agent_chat import spool as spool_mod
+from agent_chat import unread as unread_mod
 
 
 @pytest.fixture(autouse=True)
@@ -19,6 +25,26 @@ def isolated_home(tmp_path, monkeypatch):
     state_mod.APP_DIR = home
     state_mod.STATE_FILE = home / "state.json"
     state_mod.STATE_LOCK = state_mod.STATE_FILE.with_suffix(".lock")
+    state_mod.SESSIONS_DIR = home / "sessions"
+    monkeypatch.delenv("AGENT_CHAT_SESSION", raising=False)
+
+    cache_mod.CACHE_DIR = home / "cache"
+
+    daemon_mod.SOCKET_PATH = home / "daemon.sock"
+
+    events_mod.EVENTS_DB = home / "events.db"
+
+    presence_mod.PRESENCE_FILE = home / "presence.json"
+    presence_mod.PRESENCE_LOG = home / "presence.log"
+    presence_mod.PRESENCE_LOCK = home / "presence.json.lock"
+
+    spool_mod.SPOOL_DIR = home / "outbox"
+    spool_mod.SPOOL_LOCK = home / "outbox.lock"
+    spool_mod.FLUSHER_LOCK = home / "outbox.flusher.lock"
+
+    unread_mod.UNREAD_FILE = home / "unread.json"
+    unread_mod.UNREAD_LOCK = unread_mod.UNREAD_FILE.with_suffix(".lock")
+    unread_mod.NOTIFY_FILE = home / "notify.txt"
 
     logging_mod.APP_DIR = home
     logging_mod.LOG_DIR = home / "logs"
@@ -0,0 +1,204 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from nio import DirectRoomsResponse, JoinResponse, SyncError, SyncResponse, UploadFilterResponse
+
+from agent_chat.cache import AliasCache, SyncCache
+from agent_chat.client import SYNC_FILTER, MatrixClient
+from agent_chat.config import AgentChatConfig
+
+HOMESERVER = "http://localhost:8008"
+
+
+class FakeNio:
+    user_id = "@me:agent-chat.local"
+
+    def __init__(self, rooms):
+        self.rooms = rooms
+        self.lookups = []
+
+    async def room_resolve_alias(self, alias):
+        self.lookups.append(alias)
+        return SimpleNamespace(room_id=self.rooms[alias])
+
+
+def _client(rooms):
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeNio(rooms)
+    return client
+
+
+def test_alias_cache_ttl_and_invalidation():
+    cache = AliasCache(HOMESERVER)
+    cache.put("#general:test", "!gen:test")
+    assert AliasCache(HOMESERVER).get("#general:test") == "!gen:test"
+    assert AliasCache("http://other:8008").get("#general:test") is None
+    assert AliasCache(HOMESERVER, ttl=-1).get("#general:test") is None
+
+    assert cache.invalidate_room("!gen:test") == ["#general:test"]
+    assert AliasCache(HOMESERVER).get("#general:test") is None
+
+
+def test_resolve_uses_cache_across_clients():
+    rooms = {"#general:agent-chat.local": "!gen:test"}
+    first = _client(rooms)
+    assert asyncio.run(first.resolve_room_alias("#general")) == "!gen:test"
+
+    second = _client(rooms)
+    assert asyncio.run(second.resolve_room_alias("general")) == "!gen:test"
+    assert second._client.lookups == []
+
+
+def test_warm_aliases_batches_misses():
+    rooms = {"#a:agent-chat.local": "!a:test", "#b:agent-chat.local": "!b:test"}
+    client = _client(rooms)
+    result = asyncio.run(client.warm_aliases(["#a", "#b", "#a"]))
+    assert result == rooms
+    assert sorted(client._client.lookups) == sorted(rooms)
+    assert AliasCache(HOMESERVER).get("#b:agent-chat.local") == "!b:test"
+
+
+def test_forget_room_on_not_found():
+    client = _client({})
+    client._aliases.put("#gone:agent-chat.local", "!gone:test")
+    assert not client._forget_room("!gone:test", SimpleNamespace(status_code="M_LIMIT_EXCEEDED"))
+    assert client._forget_room("!gone:test", SimpleNamespace(status_code="M_NOT_FOUND"))
+    assert AliasCache(HOMESERVER).get("#gone:agent-chat.local") is None
+
+
+class FakeDirectNio:
+    user_id = "@me:agent-chat.local"
+    access_token = "token"
+
+    def __init__(self, direct_map):
+        self.direct_map = direct_map
+        self.created = []
+
+    async def list_direct_rooms(self):
+        return DirectRoomsResponse({k: list(v) for k, v in self.direct_map.items()})
+
+    async def room_create(self, is_direct=False, invite=()):
+        self.created.append(list(invite))
+        return SimpleNamespace(room_id="!new:test")
+
+    async def send(self, method, path, data):
+        self.direct_map = json.loads(data)
+        return SimpleNamespace(status=200, release=lambda: None)
+
+
+def test_dm_lookup_uses_m_direct():
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeDirectNio({"@bob:agent-chat.local": ["!old:test", "!dm:test"]})
+    assert asyncio.run(client._get_or_create_dm_room("@bob")) == "!dm:test"
+
+    # A fresh client answers from the local copy without asking the server
+    again = MatrixClient(AgentChatConfig.load())
+    again._client = FakeDirectNio({})
+    assert asyncio.run(again._get_or_create_dm_room("bob")) == "!dm:test"
+    assert again._client.created == []
+
+
+def test_new_dm_is_recorded_in_m_direct():
+    client = MatrixClient(AgentChatConfig.load())
+    nio_client = FakeDirectNio({"@bob:agent-chat.local": ["!dm:test"]})
+    client._client = nio_client
+    assert asyncio.run(client._get_or_create_dm_room("@carol")) == "!new:test"
+    assert nio_client.created == [["@carol:agent-chat.local"]]
+    assert nio_client.direct_map == {
+        "@bob:agent-chat.local": ["!dm:test"],
+        "@carol:agent-chat.local": ["!new:test"],
+    }
+
+
+def _sync_response(next_batch, join=(), leave=()):
+    room = {"timeline": {"events": []}, "state": {"events": []}}
+    return SyncResponse.from_dict({
+        "next_batch": next_batch,
+        "rooms": {"join": {r: room for r in join}, "leave": {r: room for r in leave}},
+    })
+
+
+class FakeSyncNio:
+    user_id = "@me:agent-chat.local"
+    access_token = "token"
+    next_batch = None
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.since = []
+        self.filters = []
+        self.uploads = 0
+
+    async def upload_filter(self, **definition):
+        self.uploads += 1
+        return UploadFilterResponse(f"f{self.uploads}")
+
+    async def sync(self, timeout=0, sync_filter=None, since=None, full_state=None):
+        self.since.append(since)
+        self.filters.append(sync_filter)
+        response = self.responses.pop(0)
+        if isinstance(response, SyncResponse):
+            self.next_batch = response.next_batch
+        return response
+
+
+def _sync_client(responses):
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeSyncNio(responses)
+    return client
+
+
+def test_sync_resumes_from_stored_token():
+    first = _sync_client([_sync_response("s1", join=["!a:test", "!b:test"])])
+    assert asyncio.run(first.check_status())["rooms"] == 2
+
+    second = _sync_client([_sync_response("s2", leave=["!b:test"])])
+    rooms = asyncio.run(second.get_joined_rooms())
+    assert second._client.since == ["s1"]
+    assert [room["room_id"] for room in rooms] == ["!a:test"]
+
+
+def test_sync_filter_uploaded_once_per_account():
+    first = _sync_client([_sync_response("s1"), _sync_response("s2")])
+    asyncio.run(first.sync_once(timeout=0))
+    asyncio.run(first.sync_once(timeout=0))
+    assert first._client.uploads == 1
+    assert first._client.filters == ["f1", "f1"]
+
+    second = _sync_client([_sync_response("s3")])
+    asyncio.run(second.sync_once(timeout=0))
+    assert second._client.uploads == 0
+    assert second._client.filters == ["f1"]
+
+
+def test_rejected_sync_token_falls_back_to_full_sync():
+    asyncio.run(_sync_client([_sync_response("s1", join=["!a:test"])]).sync_once(timeout=0))
+
+    client = _sync_client([SyncError("bad token"), _sync_response("s9", join=["!c:test"])])
+    asyncio.run(client.sync_once(timeout=0))
+    assert client._client.since == ["s1", None]
+    assert client._client.filters == ["f1", SYNC_FILTER]
+    assert SyncCache("@me:agent-chat.local").joined() == ["!c:test"]
+
+
+def test_join_skipped_for_known_rooms():
+    client = _sync_client([_sync_response("s1", join=["!a:test"])])
+    joins = []
+
+    async def join(room_id):
+        joins.append(room_id)
+        return JoinResponse(room_id)
+
+    client._client.join = join
+    asyncio.run(client.sync_once(timeout=0))
+    asyncio.run(client._ensure_joined("!a:test"))
+    asyncio.run(client._ensure_joined("!b:test"))
+    asyncio.run(client._ensure_joined("!b:test"))
+    assert joins == ["!b:test"]
+    assert client._avoided_joins == 2
+
+    # A kick reported by the server makes the next call join again
+    assert client._forget_room("!b:test", SimpleNamespace(status_code="M_FORBIDDEN"))
+    asyncio.run(client._ensure_joined("!b:test"))
+    assert joins == ["!b:test", "!b:test"]
@@ -1,6 +1,10 @@
+import time
+
+import pytest
 from typer.testing import CliRunner
 
 from agent_chat import app
+from agent_chat.utils import parse_time
 
 def test_channels_command():
     runner = CliRunner()
@@ -19,3 +23,41 @@ def test_config_identity():
     result = runner.invoke(app, ["config", "--set", "identity.username=testagent"])
     assert result.exit_code == 0
     assert "testagent" in result.stdout
+
+def test_send_keeps_read_marker(monkeypatch):
+    from agent_chat import daemon
+    from agent_chat.state import AgentChatState
+
+    AgentChatState.load().touch_channel("#dev", "$5")
+    reply = [{"target": "#dev", "message": "hi", "event_id": "$9"}]
+    monkeypatch.setattr(daemon, "request", lambda op, **args: reply)
+    result = CliRunner().invoke(app, ["send", "#dev", "hi"])
+    assert result.exit_code == 0
+    assert AgentChatState.load().channels["#dev"].msgid == "$5"
+
+def test_cli_import_does_not_load_nio():
+    import subprocess
+    import sys
+
+    code = "import sys, agent_chat.cli; sys.exit('nio' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+def test_notify_fast_path(capsys):
+    from agent_chat.__main__ import main
+    from agent_chat.unread import UnreadEntry, UnreadIndex
+
+    with UnreadIndex.edit() as index:
+        index.rooms["#alerts"] = UnreadEntry(count=2, urgent=True)
+        index.synced_at = time.time()
+
+    main(["notify", "--oneline"])
+    assert capsys.readouterr().out == "[chat] #alerts(2!)\n"
+
+
+def test_parse_time():
+    now = time.time() * 1000
+    assert abs(parse_time("2h") - (now - 7_200_000)) < 1000
+    assert abs(parse_time("30m") - (now - 1_800_000)) < 1000
+    assert parse_time("2026-01-01T00:00:00+00:00") == 1767225600000
+    with pytest.raises(ValueError):
+        parse_time("yesterday")
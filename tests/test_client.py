@@ -0,0 +1,330 @@
+import asyncio
+from types import SimpleNamespace
+
+from nio import (
+    JoinResponse,
+    MessageDirection,
+    RoomMessagesResponse,
+    RoomSendResponse,
+    SyncError,
+    SyncResponse,
+)
+
+from agent_chat import client as client_mod
+
+from agent_chat.client import HistoryMessage, MatrixClient
+from agent_chat.config import AgentChatConfig
+from agent_chat.events import EventStore
+from agent_chat.state import AgentChatState
+from agent_chat.unread import collect_unread
+
+
+class SlowHistoryClient(MatrixClient):
+    """MatrixClient whose fetch_history is scripted per target."""
+
+    def __init__(self, delays):
+        super().__init__(AgentChatConfig.load())
+        self.delays = delays
+        self.in_flight = 0
+        self.peak = 0
+
+    async def warm_aliases(self, aliases):
+        return {}
+
+    async def fetch_history(self, target, limit=20, **bounds):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            delay = self.delays[target]
+            if delay is None:
+                raise RuntimeError("boom")
+            await asyncio.sleep(delay)
+            return [HistoryMessage(target, "@a:test", "hi", f"${target}", 0)]
+        finally:
+            self.in_flight -= 1
+
+
+def test_fetch_many_returns_partial_results():
+    client = SlowHistoryClient({"#a": 0, "#b": None, "#slow": 5, "@bob": 0})
+    results = asyncio.run(client.fetch_many(["#a", "#b", "#slow", "@bob", "#a"], timeout=0.2))
+    assert list(results) == ["#a", "@bob"]
+    assert results["#a"][0].event_id == "$#a"
+
+
+def test_fetch_many_bounds_concurrency():
+    client = SlowHistoryClient({f"#r{i}": 0.01 for i in range(10)})
+    results = asyncio.run(client.fetch_many(list(client.delays), concurrency=3))
+    assert len(results) == 10
+    assert client.peak == 3
+
+
+class FakeTimelineNio:
+    """A room whose timeline is events $1..$N; tokens are positions in it."""
+
+    user_id = "@me:agent-chat.local"
+
+    def __init__(self, count):
+        self.events = [
+            SimpleNamespace(event_id=f"${i}", sender="@a:test", body=f"m{i}", server_timestamp=i)
+            for i in range(1, count + 1)
+        ]
+        self.pages = 0
+
+    async def join(self, room_id):
+        return JoinResponse(room_id)
+
+    async def room_messages(
+        self, room_id, start="", direction=MessageDirection.back, limit=10, message_filter=None
+    ):
+        self.pages += 1
+        pos = int(start[1:]) if start else len(self.events)
+        if direction == MessageDirection.back:
+            chunk = self.events[max(pos - limit, 0):pos][::-1]
+            return RoomMessagesResponse(room_id, chunk, f"t{pos}", f"t{pos - len(chunk)}")
+        chunk = self.events[pos:pos + limit]
+        return RoomMessagesResponse(room_id, chunk, start, f"t{pos + len(chunk)}")
+
+
+def _timeline_client(count):
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeTimelineNio(count)
+    return client
+
+
+def test_fetch_history_pages_back_to_event():
+    client = _timeline_client(50)
+    messages = asyncio.run(client.fetch_history("!room:test", 10, after="$12"))
+    assert [m.event_id for m in messages] == [f"${i}" for i in range(13, 51)]
+    assert client._client.pages == 4
+    assert client.history_token("!room:test") == "t50"
+
+
+def test_fetch_history_reads_forward_from_token():
+    client = _timeline_client(50)
+    messages = asyncio.run(client.fetch_history("!room:test", 10, after="t45"))
+    assert [m.event_id for m in messages] == [f"${i}" for i in range(46, 51)]
+    assert client.history_token("!room:test") == "t50"
+
+    client._client.pages = 0
+    assert asyncio.run(client.fetch_history("!room:test", 10, after="t50")) == []
+    assert client._client.pages == 1
+
+
+def test_collect_unread_counts_past_one_page():
+    client = _timeline_client(50)
+    client._aliases.put("#alerts:agent-chat.local", "!alerts:test")
+    state = AgentChatState.load()
+    with state.batch():
+        for channel in list(state.subscribed_channels):
+            state.remove_subscription(channel)
+        state.ensure_subscription("#alerts")
+    state.touch_channel("#alerts", "$12")
+
+    assert asyncio.run(collect_unread(client, state))["#alerts"]["count"] == 38
+
+    # The next scan reads on from the stored token; our own messages don't count
+    client._client.events += [
+        SimpleNamespace(event_id="$51", sender="@a:test", body="!urgent", server_timestamp=51),
+        SimpleNamespace(event_id="$52", sender="@me:agent-chat.local", body="ok", server_timestamp=52),
+    ]
+    client._client.pages = 0
+    assert asyncio.run(collect_unread(client, state)) == {"#alerts": {"count": 39, "urgent": True}}
+    assert client._client.pages == 2
+
+
+def test_iter_history_stops_at_since():
+    client = _timeline_client(500)
+
+    async def read():
+        return [m.event_id async for m in client.iter_history("!room:test", since=451, until=490, page_size=20)]
+
+    assert asyncio.run(read()) == [f"${i}" for i in range(490, 450, -1)]
+    assert client._client.pages == 3
+
+
+class FakeSendNio:
+    user_id = "@me:agent-chat.local"
+
+    def __init__(self):
+        self.sent = []
+        self.joins = []
+
+    async def room_resolve_alias(self, alias):
+        return SimpleNamespace(status_code="M_NOT_FOUND")
+
+    async def join(self, room_id):
+        self.joins.append(room_id)
+        return JoinResponse(room_id)
+
+    async def room_send(self, room_id, message_type, content, tx_id=None):
+        await asyncio.sleep(0)
+        self.sent.append((room_id, content["body"], tx_id))
+        return RoomSendResponse(f"$e{len(self.sent)}", room_id)
+
+
+def test_send_many_joins_once_and_reports_each_message():
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeSendNio()
+    client._aliases.put("#a:agent-chat.local", "!a:test")
+    client._aliases.put("#b:agent-chat.local", "!b:test")
+    messages = [("#a", "one"), ("#b", "one"), ("#a", "two"), ("#missing", "one")]
+
+    results = asyncio.run(client.send_many(messages))
+
+    assert [(r.target, r.message, r.ok) for r in results] == [
+        ("#a", "one", True), ("#b", "one", True), ("#a", "two", True), ("#missing", "one", False),
+    ]
+    assert "Could not resolve" in results[3].error
+    assert sorted(client._client.joins) == ["!a:test", "!b:test"]
+    assert [body for room, body, _ in client._client.sent if room == "!a:test"] == ["one", "two"]
+    assert len({tx_id for _, _, tx_id in client._client.sent}) == 3
+
+
+class FlakySendNio(FakeSendNio):
+    async def room_send(self, room_id, message_type, content, tx_id=None):
+        if room_id == "!b:test":
+            raise ConnectionError("connection reset")
+        return await super().room_send(room_id, message_type, content, tx_id)
+
+
+def test_send_many_keeps_results_when_a_send_raises():
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FlakySendNio()
+    client._aliases.put("#a:agent-chat.local", "!a:test")
+    client._aliases.put("#b:agent-chat.local", "!b:test")
+
+    results = asyncio.run(client.send_many([("#a", "one"), ("#b", "one")]))
+
+    assert [r.ok for r in results] == [True, False]
+    assert results[0].event_id
+    assert results[1].error == "connection reset"
+
+
+class FakeRoomsNio(FakeSendNio):
+    def __init__(self, aliases):
+        super().__init__()
+        self.aliases = aliases
+        self.created = []
+
+    async def room_resolve_alias(self, alias):
+        if alias in self.aliases:
+            return SimpleNamespace(room_id=self.aliases[alias])
+        return await super().room_resolve_alias(alias)
+
+    async def join(self, room_id):
+        if room_id == "!old:test":
+            self.joins.append(room_id)
+            return SimpleNamespace(status_code="M_FORBIDDEN")
+        return await super().join(room_id)
+
+    async def room_create(self, alias, **options):
+        self.created.append(alias)
+        return SimpleNamespace(room_id=f"!{alias}:test")
+
+
+def test_join_or_create_drops_a_stale_cached_room():
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeRoomsNio({"#ops:agent-chat.local": "!ops:test"})
+    client._aliases.put("#ops:agent-chat.local", "!old:test")
+
+    assert asyncio.run(client.join_or_create_room("ops")) == "!ops:test"
+    assert client._client.joins == ["!old:test", "!ops:test"]
+    assert client._aliases.get("#ops:agent-chat.local") == "!ops:test"
+
+
+def test_created_room_alias_is_cached():
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeRoomsNio({})
+
+    assert asyncio.run(client.join_or_create_room("#new")) == "!new:test"
+    assert asyncio.run(client.join_or_create_room("#new")) == "!new:test"
+    assert client._client.created == ["new"]
+
+
+def test_fetched_history_is_stored_locally():
+    client = _timeline_client(30)
+    asyncio.run(client.fetch_history("!room:test", 10))
+    assert [m.event_id for m in EventStore().search("m25")] == ["$25"]
+
+
+def _message_sync(next_batch, room_id, *stamps):
+    events = [
+        {
+            "type": "m.room.message", "event_id": f"${ts}", "sender": "@a:test",
+            "origin_server_ts": ts, "content": {"msgtype": "m.text", "body": f"m{ts}"},
+        }
+        for ts in stamps
+    ]
+    return SyncResponse.from_dict({
+        "next_batch": next_batch,
+        "rooms": {"join": {room_id: {"timeline": {"events": events}, "state": {"events": []}}}},
+    })
+
+
+class FakeStreamNio:
+    user_id = "@me:agent-chat.local"
+    next_batch = None
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.timeouts = []
+
+    async def upload_filter(self, **definition):
+        return SimpleNamespace()
+
+    async def sync(self, timeout=0, sync_filter=None, since=None, full_state=None):
+        self.timeouts.append(timeout)
+        response = self.responses.pop(0)
+        if isinstance(response, SyncResponse):
+            self.next_batch = response.next_batch
+        return response
+
+
+def test_stream_skips_backlog_and_reconnects(monkeypatch):
+    monkeypatch.setattr(client_mod, "STREAM_RETRY_DELAY", 0)
+    client = MatrixClient(AgentChatConfig.load())
+    client._aliases.put("#a:agent-chat.local", "!a:test")
+    client._client = FakeStreamNio([
+        _message_sync("s1", "!a:test", 1, 2),
+        SyncError("connection reset"),
+        _message_sync("s2", "!other:test", 3),
+        _message_sync("s3", "!a:test", 4),
+    ])
+
+    async def read():
+        stream = client.stream(["#a"], after=1, timeout=5000)
+        return [(await stream.__anext__()) for _ in range(2)]
+
+    assert [(t, m.event_id) for t, m in asyncio.run(read())] == [("#a", "$2"), ("#a", "$4")]
+    assert client._client.timeouts == [0, 5000, 5000, 5000]
+
+
+def test_account_data_path_matches_the_spec():
+    path = client_mod.account_data_path("@me:agent-chat.local", "m.direct", "tok/en")
+
+    assert path == "/_matrix/client/v3/user/%40me%3Aagent-chat.local/account_data/m.direct?access_token=tok%2Fen"
+
+
+class FakeAccountDataNio:
+    user_id = "@me:agent-chat.local"
+    access_token = "token"
+
+    def __init__(self):
+        self.requests = []
+
+    async def send(self, method, path, data=None):
+        self.requests.append((method, path, data))
+        return SimpleNamespace(status=200, release=lambda: None)
+
+
+def test_direct_map_is_put_to_account_data():
+    client = MatrixClient(AgentChatConfig.load())
+    client._client = FakeAccountDataNio()
+
+    asyncio.run(client._put_direct_map({"@bob:agent-chat.local": ["!dm:test"]}))
+
+    assert client._client.requests == [(
+        "PUT",
+        "/_matrix/client/v3/user/%40me%3Aagent-chat.local/account_data/m.direct?access_token=token",
+        '{"@bob:agent-chat.local": ["!dm:test"]}',
+    )]
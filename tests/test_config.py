@@ -1,4 +1,5 @@
-from agent_chat.config import AgentChatConfig
+from agent_chat import config as config_mod
+from agent_chat.config import AgentChatConfig, load_profile, set_credentials
 
 def test_config_roundtrip():
     cfg = AgentChatConfig.load()
@@ -14,3 +15,31 @@ def test_config_defaults():
     # Should have sensible defaults
     assert cfg.server.url is not None
     assert cfg.identity.display_name is not None
+
+
+def test_load_is_cached_and_never_writes():
+    assert not config_mod.CONFIG_FILE.exists()
+    AgentChatConfig.load().identity.username = "mutated"
+    assert AgentChatConfig.load().identity.username == ""
+    assert not config_mod.CONFIG_FILE.exists()
+
+    cfg = AgentChatConfig.load()
+    cfg.identity.username = "bluelake"
+    cfg.save()
+    set_credentials("@bluelake:test", "token")
+    profile = load_profile()
+    assert profile.config.identity.username == "bluelake"
+    assert profile.credentials["access_token"] == "token"
+
+    # An edit by another process is picked up
+    config_mod.CONFIG_FILE.write_text('[identity]\nusername = "greencastle"\n')
+    assert AgentChatConfig.load().identity.username == "greencastle"
+
+
+def test_session_id_is_a_safe_directory_name(monkeypatch):
+    for raw, expected in [
+        ("auth", "auth"), (" feature/x y ", "feature-x-y"), ("v1.2", "v1.2"),
+        (".", "-"), ("..", "--"), ("", None),
+    ]:
+        monkeypatch.setenv(config_mod.SESSION_ENV, raw)
+        assert config_mod.session_id() == expected
@@ -0,0 +1,147 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from agent_chat import daemon
+from agent_chat.client import HistoryMessage
+from agent_chat.state import AgentChatState, layer_states
+from agent_chat.unread import UnreadIndex
+
+
+class FakeClient:
+    user_id = "@me:test"
+
+    def __init__(self):
+        self.sent = []
+
+    async def sync_once(self, timeout=0):
+        await asyncio.sleep(3600)
+
+    async def warm_aliases(self, aliases):
+        return {alias: f"!{alias.strip('#')}:test" for alias in aliases}
+
+    async def resolve_target(self, target):
+        return f"!{target.strip('#@')}:test"
+
+    async def send_message(self, target, message):
+        self.sent.append((target, message))
+        return True
+
+    async def fetch_history(self, target, limit=20, **bounds):
+        return [HistoryMessage("!room:test", "@bob:test", "hi", "$1", 1000)]
+
+    async def fetch_many(self, targets, limit=20, **bounds):
+        return {target: await self.fetch_history(target, limit) for target in targets}
+
+    def history_token(self, target):
+        return None
+
+    async def close(self):
+        pass
+
+
+def test_request_without_daemon():
+    with pytest.raises(daemon.DaemonUnavailable):
+        daemon.request("ping")
+    assert not daemon.is_running()
+
+
+def test_request_maps_bad_daemons_to_daemon_errors():
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(daemon.SOCKET_PATH))
+        server.listen()
+        # Accepted by the kernel but never answered
+        with pytest.raises(daemon.DaemonError):
+            daemon.request("ping", timeout=0.1)
+
+        # Drop the connection the first request gave up on
+        server.accept()[0].close()
+
+        def reply_garbage():
+            conn, _ = server.accept()
+            with conn:
+                conn.recv(1024)
+                conn.sendall(b"<html>\n")
+
+        thread = threading.Thread(target=reply_garbage)
+        thread.start()
+        with pytest.raises(daemon.DaemonError):
+            daemon.request("ping", timeout=1.0)
+        thread.join()
+    assert not daemon.is_running()
+
+
+def test_daemon_roundtrip():
+    client = FakeClient()
+    server = daemon.Daemon(client)
+
+    async def scenario():
+        task = asyncio.create_task(server.serve())
+        while not daemon.SOCKET_PATH.exists():
+            await asyncio.sleep(0.01)
+        sent = await asyncio.to_thread(daemon.request, "send", target="#general", message="hey")
+        history = await asyncio.to_thread(
+            daemon.request, "listen", targets=["#general"], limit=5
+        )
+        with pytest.raises(daemon.DaemonError):
+            await asyncio.to_thread(daemon.request, "bogus")
+        await asyncio.to_thread(daemon.request, "stop")
+        await task
+        return sent, history
+
+    sent, history = asyncio.run(scenario())
+    assert sent is True
+    assert client.sent == [("#general", "hey")]
+    assert HistoryMessage(**history["#general"][0]).text == "hi"
+    assert not daemon.SOCKET_PATH.exists()
+
+
+def test_index_sync_per_layer(monkeypatch):
+    monkeypatch.setenv("AGENT_CHAT_SESSION", "one")
+    AgentChatState.load().ensure_subscription("#only-one")
+    monkeypatch.delenv("AGENT_CHAT_SESSION")
+
+    client = FakeClient()
+    client.timeline_messages = lambda response: [
+        HistoryMessage("!only-one:test", "@bob:test", "hi", "$1", 1000),
+        HistoryMessage("!only-one:test", "@me:test", "mine", "$2", 1001),
+    ]
+    server = daemon.Daemon(client)
+    layers = layer_states()
+    asyncio.run(server._track_rooms(layers))
+    server._seeded.update(layers)
+    server._index_sync(None, layers)
+
+    assert UnreadIndex.load("one").summary(["#only-one"])["#only-one"]["count"] == 1
+    assert "#only-one" not in UnreadIndex.load().rooms
+
+
+def test_initial_sync_counts_only_what_the_scan_missed():
+    AgentChatState.load().ensure_subscription("#general")
+    bob = [HistoryMessage("!general:test", "@bob:test", f"m{i}", f"${i}", i) for i in (1, 2)]
+
+    class SyncingClient(FakeClient):
+        async def sync_once(self, timeout=0):
+            if timeout:
+                await asyncio.sleep(3600)
+            return "initial"
+
+        def timeline_messages(self, response):
+            # The scan saw $1; $2 arrived before the initial sync
+            return bob
+
+    server = daemon.Daemon(SyncingClient())
+
+    async def scenario():
+        task = asyncio.create_task(server._sync_loop())
+        for _ in range(500):
+            if UnreadIndex.load().synced_at:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+    entry = UnreadIndex.load().rooms["#general"]
+    assert (entry.count, entry.last_event_id) == (2, "$2")
@@ -0,0 +1,63 @@
+from typer.testing import CliRunner
+
+from agent_chat import app
+from agent_chat.cache import AliasCache
+from agent_chat.config import AgentChatConfig
+from agent_chat.events import EventStore, fts_query
+from agent_chat.models import HistoryMessage
+
+
+def _msg(event_id, text, room="!myapp:test", sender="@bluelake:agent-chat.local", ts=1000):
+    return HistoryMessage(room, sender, text, event_id, ts)
+
+
+def _store():
+    store = EventStore()
+    store.add([
+        _msg("$1", "[HANDOFF] auth module ready for review", ts=1000),
+        _msg("$2", "[DONE] auth refactor", sender="@greencastle:agent-chat.local", ts=2000),
+        _msg("$3", "[HANDOFF] billing", room="!general:test", ts=3000),
+        _msg("$1", "duplicate is ignored", ts=4000),
+    ])
+    return store
+
+
+def test_fts_query_quotes_words():
+    assert fts_query('[HANDOFF] say "hi"') == '"[HANDOFF]" "say" """hi"""'
+
+
+def test_search_and_history():
+    store = _store()
+    assert [m.event_id for m in store.search("[HANDOFF]")] == ["$1", "$3"]
+    assert [m.event_id for m in store.search("auth", sender="greencastle")] == ["$2"]
+    assert [m.event_id for m in store.search("handoff", room_id="!general:test")] == ["$3"]
+    assert [m.event_id for m in store.search("auth", since=1500)] == ["$2"]
+    assert [m.text for m in store.history("!myapp:test", limit=1)] == ["[DONE] auth refactor"]
+    store.close()
+
+
+def test_search_command_works_offline():
+    _store().close()
+    AliasCache(AgentChatConfig.load().server.url).put("#myapp:agent-chat.local", "!myapp:test")
+    result = CliRunner().invoke(app, ["search", "handoff", "--room", "#myapp"])
+    assert result.exit_code == 0
+    assert "auth module" in result.output
+    assert "billing" not in result.output
+
+    result = CliRunner().invoke(app, ["listen", "#myapp", "--cached"])
+    assert result.exit_code == 0
+    assert "auth refactor" in result.output
+
+
+def test_sender_nick_is_matched_literally():
+    store = EventStore()
+    store.add([
+        _msg("$1", "status ok", sender="@agent_1:agent-chat.local"),
+        _msg("$2", "status ok", sender="@agentX1:agent-chat.local"),
+        _msg("$3", "status ok", sender="@a%b:agent-chat.local"),
+        _msg("$4", "status ok", sender="@axxb:agent-chat.local"),
+    ])
+    assert [m.event_id for m in store.search("status", sender="agent_1")] == ["$1"]
+    assert [m.event_id for m in store.search("status", sender="a%b")] == ["$3"]
+    assert [m.event_id for m in store.search("status", sender="a\\")] == []
+    store.close()
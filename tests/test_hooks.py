@@ -0,0 +1,130 @@
+import asyncio
+import json
+import subprocess
+from pathlib import Path
+
+from agent_chat import config as config_mod
+from agent_chat import hooks, spool
+from agent_chat import unread as unread_mod
+from agent_chat.client import HistoryMessage
+from agent_chat.hooks import HookRunner, get_project
+from agent_chat.presence import update_presence
+from agent_chat.state import AgentChatState
+
+
+class FakeClient:
+    user_id = "@me:test"
+
+    def __init__(self, alerts):
+        self.alerts = alerts
+        self.joined = []
+        self.presence = []
+        self.presence_ok = True
+
+    async def set_presence(self, status, message=""):
+        self.presence.append((status, message))
+        return self.presence_ok
+
+    async def join_or_create_room(self, alias, topic=""):
+        self.joined.append(alias)
+        return "!project:test"
+
+    async def fetch_history(self, target, limit=20):
+        return self.alerts[-limit:]
+
+
+def _queued():
+    return [(msg.target, msg.message) for msg in spool.pending()]
+
+
+def _alert(event_id, text):
+    return HistoryMessage("!alerts:test", "@ci:test", text, event_id, 1000)
+
+
+def test_get_project():
+    assert get_project("/home/me/My_Cool.App") == "my-cool-app"
+    assert get_project("/") == "default"
+
+
+def test_session_start_runs_in_one_client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = FakeClient([_alert("$1", "[BUILD] main is red")])
+    output = asyncio.run(HookRunner(client, "bluelake").session_start())
+
+    project = get_project(str(tmp_path))
+    assert client.joined == [f"#{project}"]
+    assert client.presence == [("online", f"Project: {project}")]
+    assert not any(target == "#status" for target, _ in _queued())
+    assert (f"#{project}", "[ONLINE] @bluelake joined") in _queued()
+    assert "main is red" in output
+    assert AgentChatState.load().channels["#alerts"].msgid == "$1"
+
+
+def test_stop_blocks_on_unread_alerts():
+    client = FakeClient([_alert("$1", "!urgent deploy broken")])
+    output = json.loads(asyncio.run(HookRunner(client, "bluelake").stop()))
+    assert output["decision"] == "block"
+    assert _queued() == []
+
+    AgentChatState.load().touch_channel("#alerts", "$1")
+    output = json.loads(asyncio.run(HookRunner(client, "bluelake").stop()))
+    assert output["decision"] == "allow"
+    assert client.presence == [("offline", "session ended")]
+    assert _queued() == []
+
+
+def test_presence_falls_back_to_status_message():
+    client = FakeClient([])
+    client.presence_ok = False
+    asyncio.run(HookRunner(client, "bluelake").stop())
+    assert _queued() == [("#status", "[OFFLINE] @bluelake | session ended")]
+
+
+def test_prompt_renews_presence_when_lease_runs_low(monkeypatch):
+    client = FakeClient([])
+    update_presence("bluelake", "busy", "auth module")
+    asyncio.run(HookRunner(client, "bluelake").user_prompt_submit())
+    assert client.presence == []
+
+    # Half of a huge TTL: the lease now counts as running low
+    monkeypatch.setattr(hooks, "PRESENCE_TTL", 10 ** 9)
+    asyncio.run(HookRunner(client, "bluelake").user_prompt_submit())
+    assert client.presence == [("busy", "auth module")]
+
+
+class DownClient:
+    user_id = None
+
+    async def _fail(self, *args, **kwargs):
+        raise ConnectionError("homeserver down")
+
+    set_presence = join_or_create_room = fetch_history = _fail
+
+    async def close(self):
+        pass
+
+
+def test_hooks_degrade_when_homeserver_is_down(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(hooks.spool, "kick", lambda: None)
+    monkeypatch.setattr(hooks, "get_client", lambda config: DownClient())
+    assert json.loads(hooks.run_hook("stop")) == {"decision": "allow"}
+    assert "Project channel" in hooks.run_hook("session-start")
+
+    def broken(config):
+        raise RuntimeError("Not logged in")
+
+    monkeypatch.setattr(hooks, "get_client", broken)
+    assert json.loads(hooks.run_hook("stop")) == {"decision": "allow"}
+    assert hooks.run_hook("user-prompt-submit") == ""
+
+
+def test_shell_scripts_find_the_session_notify_file(monkeypatch):
+    script = Path(__file__).parents[1] / "hooks" / "session.sh"
+    for name in ["auth", "feature/x y", "..", "é"]:
+        monkeypatch.setenv("AGENT_CHAT_SESSION", name)
+        result = subprocess.run(
+            ["bash", "-c", f'source "{script}"; printf %s "$NOTIFY_FILE"'],
+            capture_output=True, text=True, check=True,
+        )
+        assert result.stdout == str(unread_mod.notify_file(config_mod.session_id()))
@@ -0,0 +1,124 @@
+import os
+import time
+
+import pytest
+from nio import SyncResponse
+
+from agent_chat import presence as presence_mod
+from agent_chat.client import MatrixClient
+from agent_chat.presence import (
+    PRESENCE_EVENT,
+    clear_stale,
+    get_presence,
+    presence_content,
+    record_presence,
+    update_presence,
+)
+
+
+def _presence(sender, status, last_seen, state_key=None, expires_in=600):
+    return {
+        "type": PRESENCE_EVENT,
+        "event_id": f"${sender}{last_seen}",
+        "sender": sender,
+        "state_key": state_key or sender,
+        "origin_server_ts": 1,
+        "content": {
+            "status": status,
+            "last_seen": last_seen,
+            "expires_at": time.time() + expires_in,
+            "host": "node-b",
+        },
+    }
+
+
+def test_sync_presence_is_cached_newest_first():
+    older = _presence("@bluelake:test", "online", "2026-01-01T10:00:00+00:00")
+    newer = _presence("@bluelake:test", "busy", "2026-01-01T11:00:00+00:00")
+    spoofed = _presence("@mallory:test", "offline", "2026-01-01T12:00:00+00:00", "@bluelake:test")
+    response = SyncResponse.from_dict({
+        "next_batch": "s1",
+        "rooms": {"join": {"!status:test": {
+            "state": {"events": [newer]},
+            "timeline": {"events": [older, spoofed]},
+        }}},
+    })
+
+    assert record_presence(MatrixClient.state_events(response)) == 1
+    agents = get_presence()
+    assert list(agents) == ["bluelake"]
+    assert agents["bluelake"]["status"] == "busy"
+    assert agents["bluelake"]["host"] == "node-b"
+
+
+def test_cwd_stays_local(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert "cwd" not in presence_content("online", "hi")
+    update_presence("bluelake", "online", "hi")
+    assert get_presence("bluelake")["cwd"] == str(tmp_path)
+
+
+def test_local_update_is_replaced_by_newer_event():
+    record_presence([_presence("@bluelake:test", "away", "2026-01-01T10:00:00+00:00")])
+    record_presence([_presence("@bluelake:test", "online", "2026-01-01T10:05:00+00:00")])
+    assert get_presence("bluelake")["status"] == "online"
+
+
+def test_updates_append_and_compact(monkeypatch):
+    monkeypatch.setattr(presence_mod, "COMPACT_BYTES", 2000)
+    for i in range(40):
+        update_presence(f"agent{i % 5}", "online", f"beat {i}")
+    with presence_mod.PRESENCE_LOG.open("a") as log:
+        log.write('{"nick": "torn", "sta')
+
+    assert presence_mod.PRESENCE_FILE.exists()
+    assert presence_mod.PRESENCE_LOG.stat().st_size < 2000
+    agents = get_presence()
+    assert sorted(agents) == [f"agent{i}" for i in range(5)]
+    assert agents["agent4"]["message"] == "beat 39"
+
+
+@pytest.mark.parametrize("finish", [False, True])
+def test_read_during_compaction_sees_every_record(monkeypatch, finish):
+    update_presence("bluelake", "online", "here")
+    read_records = presence_mod._read_records
+    compacted = []
+
+    def compact_after_first_read(path):
+        records = read_records(path)
+        if not compacted:
+            compacted.append(path)
+            if finish:
+                monkeypatch.setattr(presence_mod, "_read_records", read_records)
+                presence_mod.compact()
+            else:
+                # Set aside, snapshot not written yet
+                os.replace(presence_mod.PRESENCE_LOG, presence_mod._compacting_log())
+        return records
+
+    monkeypatch.setattr(presence_mod, "_read_records", compact_after_first_read)
+    assert presence_mod._load_state()[0]["bluelake"]["status"] == "online"
+    assert compacted
+
+
+def test_expired_leases_go_offline_then_are_dropped():
+    record_presence([
+        _presence("@gone:test", "online", "2026-01-01T09:00:00+00:00", expires_in=-1),
+        _presence("@long_gone:test", "online", "2026-01-01T09:00:00+00:00",
+                  expires_in=-presence_mod.OFFLINE_RETENTION - 1),
+        _presence("@here:test", "online", "2026-01-01T09:00:00+00:00"),
+    ])
+
+    agents = get_presence()
+    assert sorted(agents) == ["gone", "here"]
+    assert agents["gone"]["status"] == "offline"
+    assert agents["gone"]["message"] == presence_mod.EXPIRED_MESSAGE
+    # The transitions were logged, so the next reader has nothing to expire
+    size = presence_mod.PRESENCE_LOG.stat().st_size
+    get_presence()
+    assert presence_mod.PRESENCE_LOG.stat().st_size == size
+
+    assert clear_stale() == 1
+    presence_mod.compact()
+    assert not presence_mod.PRESENCE_LOG.exists()
+    assert list(get_presence()) == ["here"]
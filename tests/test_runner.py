@@ -0,0 +1,29 @@
+import asyncio
+
+from agent_chat import runner
+
+
+class FakeClient:
+    closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_run_reuses_one_loop_and_closes_clients_at_shutdown():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    client = runner.track(FakeClient())
+    first = runner.run(current_loop())
+    assert runner.run(current_loop()) is first
+
+    runner.shutdown()
+    assert client.closed
+    assert first.is_closed()
+    runner.shutdown()
+
+
+def test_loop_factory_can_be_forced_to_asyncio(monkeypatch):
+    monkeypatch.setenv("AGENT_CHAT_LOOP", "asyncio")
+    assert runner.loop_factory() is None
@@ -0,0 +1,69 @@
+import asyncio
+
+from agent_chat import spool
+from agent_chat.locks import file_lock
+from agent_chat.models import SendResult
+
+
+class FakeClient:
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.sent = []
+
+    async def send_many(self, messages, tx_ids=None):
+        [(target, message)], [tx_id] = list(messages), list(tx_ids)
+        outcome = self.failures.get(message, [])
+        if outcome:
+            return [SendResult(target, message, tx_id=tx_id, **outcome.pop(0))]
+        self.sent.append((target, message, tx_id))
+        return [SendResult(target, message, event_id=f"$e{len(self.sent)}", tx_id=tx_id)]
+
+
+def test_flush_delivers_alerts_first_and_status_last():
+    spool.enqueue("#status", "[ONLINE] @a")
+    spool.enqueue("#myapp", "one")
+    spool.enqueue("#alerts", "[BUILD] red")
+    spool.enqueue("#myapp", "two")
+
+    client = FakeClient()
+    assert asyncio.run(spool.flush(client)) is None
+    assert [body for _, body, _ in client.sent] == ["[BUILD] red", "one", "two", "[ONLINE] @a"]
+    assert spool.pending() == []
+
+
+def test_flush_keeps_tx_id_and_order_after_failure():
+    first = spool.enqueue("#myapp", "one")
+    spool.enqueue("#myapp", "two")
+    spool.enqueue("#other", "three")
+    client = FakeClient({"one": [{"error": "timeout"}]})
+
+    delay = asyncio.run(spool.flush(client))
+    assert 0 < delay <= spool.RETRY_BASE_DELAY
+    assert [body for _, body, _ in client.sent] == ["three"]
+    [retry, held] = spool.pending()
+    assert (retry.message, retry.attempts, held.message) == ("one", 1, "two")
+
+    retry.not_before = 0
+    retry.save()
+    asyncio.run(spool.flush(client))
+    assert [body for _, body, _ in client.sent] == ["three", "one", "two"]
+    assert client.sent[1][2] == first.tx_id
+
+
+def test_flush_waits_out_short_rate_limits():
+    spool.enqueue("#myapp", "one")
+    client = FakeClient({"one": [{"error": "M_LIMIT_EXCEEDED", "retry_after_ms": 10}]})
+    assert asyncio.run(spool.flush(client)) is None
+    assert [body for _, body, _ in client.sent] == ["one"]
+
+
+def test_kick_leaves_a_running_flusher_alone(monkeypatch):
+    started = []
+    monkeypatch.setattr(spool.subprocess, "Popen", lambda *args, **kwargs: started.append(args))
+    with file_lock(spool.FLUSHER_LOCK):
+        spool.kick()
+        asyncio.run(spool.drain(FakeClient()))
+    assert started == []
+
+    spool.kick()
+    assert len(started) == 1
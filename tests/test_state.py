@@ -1,4 +1,4 @@
-from agent_chat.state import AgentChatState, LastSeenEntry
+from agent_chat.state import AgentChatState, LastSeenEntry, session_subscriptions
 
 def test_state_defaults(tmp_path):
     state = AgentChatState.load()
@@ -9,3 +9,55 @@ def test_state_defaults(tmp_path):
     assert state.channels["#dev"].msgid == "msg123"
     state.touch_direct("@BlueLake", "dm1")
     assert state.directs["@BlueLake"].msgid == "dm1"
+
+
+def test_batch_writes_once_and_merges_other_writers(monkeypatch):
+    mine = AgentChatState.load()
+    theirs = AgentChatState.load()
+    theirs.ensure_subscription("#theirs")
+    theirs.touch_channel("#general", "their-read")
+
+    writes = []
+    real_write = AgentChatState._write
+    monkeypatch.setattr(
+        AgentChatState, "_write", lambda self, path: writes.append(path) or real_write(self, path)
+    )
+    with mine.batch():
+        for i in range(5):
+            mine.ensure_subscription(f"#room{i}")
+            mine.touch_channel(f"#room{i}", f"m{i}")
+        mine.remove_subscription("#room4")
+    assert len(writes) == 1
+
+    merged = AgentChatState.load()
+    assert merged.channels["#general"].msgid == "their-read"
+    assert "#theirs" in merged.subscribed_channels
+    assert [f"#room{i}" for i in range(4)] == [c for c in merged.subscribed_channels if c.startswith("#room")]
+    assert mine.subscribed_channels == merged.subscribed_channels
+
+
+def test_sessions_keep_their_own_read_markers(monkeypatch):
+    AgentChatState.load().touch_channel("#general", "shared-read")
+
+    monkeypatch.setenv("AGENT_CHAT_SESSION", "one")
+    one = AgentChatState.load()
+    one.touch_channel("#general", "one-read")
+    one.ensure_subscription("#one")
+    one.remove_subscription("#status")
+
+    monkeypatch.setenv("AGENT_CHAT_SESSION", "two")
+    two = AgentChatState.load()
+    assert two.channels["#general"].msgid == "shared-read"
+    assert "#one" not in two.subscribed_channels
+    assert "#status" in two.subscribed_channels
+
+    monkeypatch.setenv("AGENT_CHAT_SESSION", "one")
+    one = AgentChatState.load()
+    assert one.channels["#general"].msgid == "one-read"
+    assert one.subscribed_channels == ["#general", "#alerts", "#one"]
+
+    monkeypatch.delenv("AGENT_CHAT_SESSION")
+    assert AgentChatState.load().channels["#general"].msgid == "shared-read"
+    layers = session_subscriptions()
+    assert layers[None] == ["#general", "#status", "#alerts"]
+    assert layers["one"] == ["#general", "#alerts", "#one"]
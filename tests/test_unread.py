@@ -0,0 +1,104 @@
+import threading
+import time
+
+from agent_chat import unread as unread_mod
+from agent_chat.client import HistoryMessage
+from agent_chat.state import AgentChatState
+from agent_chat.unread import UnreadIndex, messages_after
+
+
+def _msg(event_id, text="hi"):
+    return HistoryMessage("!room:test", "@bob:test", text, event_id, 1000)
+
+
+def _record_alert():
+    with UnreadIndex.edit() as index:
+        index.record("#alerts", _msg("$9"))
+
+
+def test_messages_after():
+    messages = [_msg("$1"), _msg("$2"), _msg("$3")]
+    assert [m.event_id for m in messages_after(messages, "$2")] == ["$3"]
+    assert messages_after(messages, "$missing") == messages
+    assert messages_after(messages, None) == messages
+
+
+def test_index_record_and_mark_read():
+    with UnreadIndex.edit() as index:
+        index.record("#alerts", _msg("$1"))
+        index.record("#alerts", _msg("$2", "!urgent build broken"))
+        index.synced_at = time.time()
+
+    index = UnreadIndex.load()
+    assert index.is_live()
+    assert index.summary(["#alerts", "#general"]) == {
+        "#alerts": {"count": 2, "urgent": True},
+        "#general": {"count": 0, "urgent": False},
+    }
+
+    with UnreadIndex.edit() as index:
+        index.mark_read("#alerts", "$2")
+    entry = UnreadIndex.load().rooms["#alerts"]
+    assert (entry.count, entry.urgent, entry.last_event_id) == (0, False, "$2")
+
+
+def test_index_without_daemon_is_not_live():
+    assert not UnreadIndex.load().is_live()
+
+
+def test_notify_file_follows_index_and_subscriptions():
+    state = AgentChatState.load()
+    state.ensure_subscription("#alerts")
+    with UnreadIndex.edit() as index:
+        index.record("#alerts", _msg("$1", "!urgent build broken"))
+        index.synced_at = time.time()
+
+    expires, line = unread_mod.NOTIFY_FILE.read_text().splitlines()
+    assert line == "[chat] #alerts(1!)"
+    assert int(expires) > time.time()
+
+    state.remove_subscription("#alerts")
+    assert unread_mod.NOTIFY_FILE.read_text().splitlines()[1:] == [""]
+
+
+def test_wait_for_change(monkeypatch):
+    monkeypatch.setattr(unread_mod, "WAIT_INTERVAL", 0.01)
+    assert not unread_mod.wait_for_change(timeout=0.05)
+
+    AgentChatState.load().ensure_subscription("#alerts")
+    timer = threading.Timer(0.05, _record_alert)
+    timer.start()
+    assert unread_mod.wait_for_change(timeout=5)
+    timer.join()
+
+
+def test_sessions_count_unread_separately():
+    AgentChatState.load().ensure_subscription("#x")
+    for session in ("one", "two"):
+        with UnreadIndex.edit(session) as index:
+            for n in range(3):
+                index.record("#x", _msg(f"${n}"))
+            index.synced_at = time.time()
+
+    with UnreadIndex.edit("one") as index:
+        index.mark_read("#x", "$2")
+
+    assert UnreadIndex.load("one").rooms["#x"].count == 0
+    assert UnreadIndex.load("two").rooms["#x"].count == 3
+    assert UnreadIndex.load().rooms == {}
+    assert unread_mod.read_notify_file(unread_mod.notify_file("one")) == ""
+    assert unread_mod.read_notify_file(unread_mod.notify_file("two")) == "[chat] #x(3)"
+
+
+def test_shard_save_only_rewrites_its_own_notify_file(monkeypatch):
+    for session in ("one", "two"):
+        with UnreadIndex.edit(session) as index:
+            index.record("#general", _msg("$1"))
+    unread_mod.notify_file("two").unlink()
+    unread_mod.NOTIFY_FILE.unlink(missing_ok=True)
+
+    monkeypatch.setenv("AGENT_CHAT_SESSION", "one")
+    AgentChatState.load().touch_channel("#general", "$1")
+    assert unread_mod.notify_file("one").exists()
+    assert not unread_mod.notify_file("two").exists()
+    assert not unread_mod.NOTIFY_FILE.exists()